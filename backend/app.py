@@ -1,23 +1,35 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 from backend.core.config import settings
-from backend.models.schemas import AskRequest, IngestRequest, ChatCreate, ChatResponse, MessageResponse
-from backend.services.rag import ask as rag_ask
-from backend.db.vectordb import reset_collection
-from backend.db.chatdb import ChatDB
-from scripts.ingest import main as ingest_main
+from backend.models.schemas import AskRequest, IngestRequest, ReembedRequest, ChatCreate, ChatResponse, ChatSearchResult, MessageResponse
+from backend.services.rag import ask as rag_ask, is_follow_up_request
+from backend.db.chatdb import ChatDB, AsyncChatDB, ImportLineTooLong, chat_cursor
+from scripts.ingest import build_parser as build_ingest_parser
+from scripts.reembed import build_parser as build_reembed_parser
+from backend.db.vectordb import get_active_index
+from backend.services.ingest_jobs import ingest_jobs
 from backend.core.logging import logger
 from backend.services.model_manager import get_mode, set_mode, get_active_model
 from backend.services.prayer_times import compute_prayer_times
-from datetime import date
+from backend.services.prefetch import start_prefetch, stop_prefetch
+from backend.services.html_extract import shutdown_extract_pool
+import json
+from datetime import date, datetime, timezone
 from typing import Optional
 
 app = FastAPI(title="Islamic RAG API", version="0.1.0")
 
-# Initialize chat database
-chat_db = ChatDB()
+# Initialize chat database (queries run off the event loop, /ask writes are batched)
+chat_db = AsyncChatDB(
+    ChatDB(archive_dir=settings.chat_archive_dir),
+    settings.chat_flush_interval_seconds,
+    settings.chat_flush_max_batch,
+    tail_size=settings.chat_context_messages,
+    tail_chats=settings.chat_tail_cache_chats,
+)
 
 # Basic CORS (will be configured later from settings)
 app.add_middleware(
@@ -25,11 +37,28 @@ app.add_middleware(
     allow_origins=settings.allowed_origins_list,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # pagination cursor for the UI
 )
 
+@app.on_event("startup")
+async def on_startup():
+    # Warm curated web sources in the background; never blocks startup
+    start_prefetch()
+    if settings.chat_write_behind:
+        chat_db.start()
+    chat_db.start_retention(settings.chat_retention_days, settings.chat_retention_interval_hours * 3600)
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await stop_prefetch()
+    shutdown_extract_pool()
+    ingest_jobs.shutdown()
+    await chat_db.stop()  # flush queued chat history
+    chat_db.close()
+
 @app.get("/health")
 async def health():
-    return {"status": "ok", "mode": get_mode(), "model": get_active_model()}
+    return {"status": "ok", "mode": get_mode(), "model": get_active_model(), "chat_write_queue": chat_db.pending}
 
 @app.post("/ask")
 async def ask(req: AskRequest):
@@ -37,6 +66,9 @@ async def ask(req: AskRequest):
     history = None
     if req.conversation_history:
         history = [{'role': m.role, 'content': m.content} for m in req.conversation_history]
+    elif req.chat_id and is_follow_up_request(req.question):
+        # Context is only used by follow-ups; served from the in-memory chat tail
+        history = await chat_db.get_recent_messages(req.chat_id)
     
     res = await rag_ask(
         question=req.question,
@@ -52,27 +84,17 @@ async def ask(req: AskRequest):
     # Save to chat history if chat_id provided
     if req.chat_id:
         try:
-            # Create chat if it doesn't exist
-            chat_db.create_chat(req.chat_id)
-            
-            # Save user message
-            chat_db.add_message(req.chat_id, "user", req.question)
-            
-            # Save assistant message
-            chat_db.add_message(
+            # Written by the write-behind flusher; the response does not wait for it
+            await chat_db.enqueue_exchange(
                 req.chat_id,
-                "assistant",
+                req.question,
                 res.get("answer", ""),
                 citations=res.get("citations"),
                 is_fallback=(res.get("mode") == "fallback"),
-                mode=res.get("mode")
+                mode=res.get("mode"),
+                # Used only if this is the chat's first Q&A pair
+                title=req.question[:50] + ("..." if len(req.question) > 50 else ""),
             )
-            
-            # Update title if it's the first message
-            messages = chat_db.get_chat_messages(req.chat_id)
-            if len(messages) == 2:  # First Q&A pair
-                title = req.question[:50] + ("..." if len(req.question) > 50 else "")
-                chat_db.update_chat_title(req.chat_id, title)
         except Exception as e:
             logger.error(f"Error saving to chat history: {e}")
     
@@ -99,31 +121,60 @@ async def update_mode(payload: ModeUpdate):
         logger.error(f"Error switching mode: {e}")
         raise HTTPException(status_code=500, detail="Failed to switch mode")
 
-@app.post("/ingest")
+@app.post("/ingest", status_code=202)
 async def ingest(req: IngestRequest):
-    # For simplicity call the CLI logic here by setting args via environment
-    # This avoids code duplication. In production, factor out shared functions.
-    import sys
-    from importlib import reload
-    os.environ["INGEST_SOURCE"] = req.path
-    os.environ["INGEST_RESET"] = "1" if req.reset else "0"
-    os.environ["INGEST_BATCH_SIZE"] = str(req.batch_size)
-    os.environ["INGEST_CHUNK_SIZE"] = str(req.chunk_size)
-    os.environ["INGEST_CHUNK_OVERLAP"] = str(req.chunk_overlap)
-    # Reuse the main; but safer approach is to refactor scripts/ingest.py to functions.
-    # Here we just run it in-process by constructing argv.
+    """Queue an ingest job; poll GET /ingest/{job_id} for progress."""
+    # --opt=value: a value starting with '-' must not be read as another option
     argv = [
-        "ingest.py",
-        "--source", req.path,
+        f"--source={req.path}",
         *( ["--reset"] if req.reset else [] ),
         "--batch-size", str(req.batch_size),
         "--chunk-size", str(req.chunk_size),
         "--chunk-overlap", str(req.chunk_overlap),
+        *( ["--workers", str(req.workers)] if req.workers else [] ),
+        *( ["--embed-concurrency", str(req.embed_concurrency)] if req.embed_concurrency else [] ),
+        *( ["--dedup-threshold", str(req.dedup_threshold)] if req.dedup_threshold is not None else [] ),
     ]
-    sys.argv = argv
-    from scripts import ingest as ingest_script
-    ingest_script.main()
-    return {"status": "ok"}
+    job = ingest_jobs.submit(build_ingest_parser().parse_args(argv))
+    if job is None:
+        raise HTTPException(status_code=429, detail="Too many ingest jobs queued")
+    return {"job_id": job.id, "status": job.status}
+
+@app.post("/reembed", status_code=202)
+async def reembed(req: ReembedRequest):
+    """Queue a re-embed of the index into a new collection, switched to once validated."""
+    argv = [
+        *( [f"--model={req.embedding_model}"] if req.embedding_model else [] ),
+        "--batch-size", str(req.batch_size),
+        *( ["--embed-concurrency", str(req.embed_concurrency)] if req.embed_concurrency else [] ),
+    ]
+    job = ingest_jobs.submit(build_reembed_parser().parse_args(argv), kind="reembed")
+    if job is None:
+        raise HTTPException(status_code=429, detail="Too many ingest jobs queued")
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/index")
+async def active_index():
+    """Collection currently serving queries and the model that embedded it."""
+    return get_active_index()
+
+@app.get("/ingest")
+async def list_ingest_jobs():
+    return [job.snapshot() for job in ingest_jobs.list()]
+
+@app.get("/ingest/{job_id}")
+async def get_ingest_job(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job.snapshot()
+
+@app.post("/ingest/{job_id}/cancel")
+async def cancel_ingest_job(job_id: str):
+    job = ingest_jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return {"job_id": job.id, "status": job.status}
 
 # Chat History Endpoints
 
@@ -131,11 +182,11 @@ async def ingest(req: IngestRequest):
 async def create_chat(chat: ChatCreate):
     """Create a new chat session."""
     try:
-        success = chat_db.create_chat(chat.id, chat.title)
+        success = await chat_db.create_chat(chat.id, chat.title)
         if not success:
             raise HTTPException(status_code=400, detail="Chat already exists")
         
-        chat_data = chat_db.get_chat(chat.id)
+        chat_data = await chat_db.get_chat(chat.id)
         return ChatResponse(**chat_data)
     except HTTPException:
         raise
@@ -144,20 +195,102 @@ async def create_chat(chat: ChatCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/chats")
-async def get_all_chats(limit: int = 50):
-    """Get all chats ordered by most recent."""
+async def get_all_chats(response: Response, limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None):
+    """Get chats ordered by most recent, one page at a time.
+
+    When more chats may follow, the X-Next-Cursor header holds the cursor for the next page.
+    """
     try:
-        chats = chat_db.get_all_chats(limit)
+        chats = await chat_db.get_all_chats(limit, cursor)
+        if len(chats) == limit:
+            response.headers["X-Next-Cursor"] = chat_cursor(chats[-1])
         return [ChatResponse(**chat) for chat in chats]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching chats: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/chats/search")
+async def search_chats(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+):
+    """Full-text search over chat messages, best matches first.
+
+    When more results may follow, X-Next-Cursor holds the offset of the next page.
+    """
+    try:
+        results = await chat_db.search_messages(q, limit, offset)
+        if len(results) == limit:
+            response.headers["X-Next-Cursor"] = str(offset + limit)
+        return [ChatSearchResult(**r) for r in results]
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error searching chats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/chats/export")
+async def export_chats(since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Stream chat history as NDJSON: each chat line is followed by its message lines.
+
+    since/until filter on the chat's last update; times without an offset are
+    taken as UTC. Runs on a read-only snapshot, so chats keep working while it streams.
+    """
+    await chat_db.flush()
+
+    def utc(dt: Optional[datetime]) -> Optional[str]:
+        # Stored timestamps are SQLite CURRENT_TIMESTAMP: UTC, no offset
+        if dt is None:
+            return None
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(timezone.utc)
+        return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+    records = chat_db.db.export_records(utc(since), utc(until))
+    lines = (json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=chathistory.ndjson"},
+    )
+
+@app.post("/chats/import")
+async def import_chats(request: Request):
+    """Import an NDJSON export (request body); chats that already exist are skipped."""
+    try:
+        return await chat_db.import_ndjson(request.stream())
+    except ImportLineTooLong as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importing chats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/chats/archived")
+async def get_archived_chats(response: Response, limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None):
+    """Chats moved to the archive by the retention policy, most recent first.
+
+    Paged like GET /chats: pass the X-Next-Cursor header back as cursor.
+    """
+    try:
+        chats = await chat_db.get_archived_chats(limit, cursor)
+        if len(chats) == limit:
+            response.headers["X-Next-Cursor"] = chat_cursor(chats[-1])
+        return [ChatResponse(**chat) for chat in chats]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching archived chats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/chats/{chat_id}", response_model=ChatResponse)
 async def get_chat(chat_id: str):
     """Get a specific chat."""
     try:
-        chat = chat_db.get_chat(chat_id)
+        chat = await chat_db.get_chat(chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
         return ChatResponse(**chat)
@@ -168,10 +301,24 @@ async def get_chat(chat_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/chats/{chat_id}/messages")
-async def get_chat_messages(chat_id: str):
-    """Get all messages for a chat."""
+async def get_chat_messages(
+    chat_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    before_id: Optional[int] = None,
+    include_citations: bool = True,
+):
+    """Get messages for a chat, oldest first.
+
+    Without limit, returns the whole chat. With limit, returns the newest page
+    (before before_id, if given); X-Next-Cursor then holds the before_id of the older page.
+    """
     try:
-        messages = chat_db.get_chat_messages(chat_id)
+        messages = await chat_db.get_chat_messages(
+            chat_id, before_id=before_id, limit=limit, include_citations=include_citations
+        )
+        if limit is not None and len(messages) == limit:
+            response.headers["X-Next-Cursor"] = str(messages[0]["id"])
         return [MessageResponse(**msg) for msg in messages]
     except Exception as e:
         logger.error(f"Error fetching messages: {e}")
@@ -181,7 +328,7 @@ async def get_chat_messages(chat_id: str):
 async def delete_chat(chat_id: str):
     """Delete a chat and all its messages."""
     try:
-        success = chat_db.delete_chat(chat_id)
+        success = await chat_db.delete_chat(chat_id)
         if not success:
             raise HTTPException(status_code=404, detail="Chat not found")
         return {"message": "Chat deleted successfully"}
@@ -195,7 +342,7 @@ async def delete_chat(chat_id: str):
 async def update_chat_title(chat_id: str, title: str):
     """Update chat title."""
     try:
-        success = chat_db.update_chat_title(chat_id, title)
+        success = await chat_db.update_chat_title(chat_id, title)
         if not success:
             raise HTTPException(status_code=404, detail="Chat not found")
         return {"message": "Title updated successfully"}
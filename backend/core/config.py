@@ -15,6 +15,31 @@ class Settings(BaseSettings):
     vectordb_dir: str = "data/vectordb"
     allowed_origins: str = "*"
     rate_limit_per_minute: int = 30
+    web_cache_path: str = "data/webcache.db"
+    web_cache_max_bytes: int = 64 * 1024 * 1024
+    web_cache_ttl_seconds: int = 3600
+    html_extract_workers: int = 4
+    prefetch_enabled: bool = True
+    prefetch_interval_seconds: int = 1800
+    prefetch_concurrency: int = 4
+    web_store_enabled: bool = False
+    web_store_ttl_seconds: int = 7 * 24 * 3600
+    # Internet mode skips the network for auto URLs only when a stored chunk scores this high
+    web_store_local_hit_score: float = 0.5
+    # Jobs share the collection and ingest manifest; keep at 1 unless sources never overlap
+    ingest_max_concurrent_jobs: int = 1
+    ingest_max_queued_jobs: int = 8
+    # Chat history write-behind: /ask exchanges are batched into periodic transactions
+    chat_write_behind: bool = True
+    chat_flush_interval_seconds: float = 0.25
+    chat_flush_max_batch: int = 256
+    # Conversation context: last messages of recently used chats kept in memory
+    chat_context_messages: int = 6
+    chat_tail_cache_chats: int = 1024
+    # Chat retention: chats idle this many days move to a compressed archive (0 = keep all)
+    chat_retention_days: int = 0
+    chat_retention_interval_hours: float = 24
+    chat_archive_dir: str = "data/chat_archive"
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
     
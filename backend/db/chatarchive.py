@@ -0,0 +1,100 @@
+"""
+Compressed archive of chats moved out of the chat history database.
+A segment is a file of NDJSON records, one chat (with its messages) per line,
+each compressed as its own zstd frame or gzip member. Concatenated they are a
+valid stream (`zstdcat`/`zcat` prints the NDJSON), and a single chat is read
+back by seeking to its (offset, length) without decompressing the rest.
+"""
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+class ChatArchive:
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.suffix = '.ndjson.zst' if zstandard is not None else '.ndjson.gz'
+
+    def _compress(self, data: bytes) -> bytes:
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=10).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    def _write(self, frames: Iterable[bytes], suffix: str) -> Tuple[str, List[Tuple[int, int]]]:
+        """Write frames to a new segment, fsynced; return its name and each frame's (offset, length)."""
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+        name = f'chats-{stamp}{suffix}'
+        n = 0
+        while (self.root / name).exists():
+            n += 1
+            name = f'chats-{stamp}-{n}{suffix}'
+        positions = []
+        offset = 0
+        tmp = self.root / (name + '.tmp')
+        with open(tmp, 'wb') as f:
+            for frame in frames:
+                f.write(frame)
+                positions.append((offset, len(frame)))
+                offset += len(frame)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.root / name)
+        return name, positions
+
+    def write_segment(self, chats: List[Dict]) -> Tuple[str, List[Tuple[int, int]]]:
+        """Write chats to a new segment; return its name and each chat's (offset, length).
+
+        The file is fsynced before returning, so callers may then delete the chats.
+        """
+        lines = (json.dumps(chat, ensure_ascii=False, separators=(',', ':')) + '\n' for chat in chats)
+        return self._write((self._compress(line.encode('utf-8')) for line in lines), self.suffix)
+
+    def copy_frames(self, segment: str, positions: List[Tuple[int, int]]) -> Tuple[str, List[Tuple[int, int]]]:
+        """Copy the given frames of segment, still compressed, to a new segment.
+
+        Returns like write_segment; the new segment keeps segment's compression.
+        """
+        path = self.root / Path(segment).name
+        suffix = '.ndjson.zst' if segment.endswith('.zst') else '.ndjson.gz'
+
+        def frames():
+            with open(path, 'rb') as f:
+                for offset, length in positions:
+                    f.seek(offset)
+                    yield f.read(length)
+
+        return self._write(frames(), suffix)
+
+    def segments(self) -> Dict[str, int]:
+        """Size in bytes of every file in the archive, by name (including leftover .tmp files)."""
+        return {path.name: path.stat().st_size for path in self.root.glob('chats-*')}
+
+    def remove(self, segment: str):
+        (self.root / Path(segment).name).unlink(missing_ok=True)
+
+    def read_chat(self, segment: str, offset: int, length: int) -> Dict:
+        """One archived chat: its fields plus 'messages'."""
+        path = self.root / Path(segment).name
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            frame = f.read(length)
+        if segment.endswith('.zst'):
+            if zstandard is None:
+                raise RuntimeError(f'{segment} needs the zstandard package')
+            data = zstandard.ZstdDecompressor().decompress(frame)
+        else:
+            data = gzip.decompress(frame)
+        return json.loads(data)
+
+    def clear(self):
+        for path in self.root.glob('chats-*'):
+            path.unlink(missing_ok=True)
@@ -1,32 +1,118 @@
 """
 Chat history database management using SQLite.
 Stores user conversations for persistence across sessions.
+
+ChatDB keeps one connection open (WAL journal, statement cache) and serializes
+access with a lock; AsyncChatDB runs it on a dedicated thread so request
+handlers await it instead of blocking the event loop on disk I/O.
 """
+import asyncio
+import functools
 import sqlite3
 import json
+import re
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from backend.core.logging import logger
+from backend.db.chatarchive import ChatArchive
+from backend.services.dedup import strip_diacritics
+
+# Page cache per connection, in KiB (negative cache_size means KiB in SQLite)
+CACHE_SIZE_KIB = 16 * 1024
+# Prepared statements kept per connection, keyed by SQL text
+STATEMENT_CACHE = 128
+# Lines per transaction when importing chat history
+IMPORT_BATCH_LINES = 1000
+# Longest import line accepted; one line is one chat or one message
+MAX_IMPORT_LINE_BYTES = 8 * 1024 * 1024
+# Search terms used from a query
+MAX_SEARCH_TERMS = 16
+# Rewrite an archive segment once this share of its bytes belongs to deleted or restored chats
+ARCHIVE_COMPACT_RATIO = 0.5
+_SEARCH_TERM = re.compile(r'(\w+)(\*?)')
+_DIACRITIC_CHARS = ''.join(chr(c) for c in range(0x0610, 0x06EE) if strip_diacritics(chr(c)) == '')
+
+
+def _fts_query(q: str) -> Optional[str]:
+    """FTS5 MATCH expression for free text: all words must match; `word*` matches a prefix.
+
+    Words are quoted, so FTS5 operators and syntax in q are searched for literally.
+    """
+    terms = _SEARCH_TERM.findall(strip_diacritics(q))[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{word}"{star}' for word, star in terms)
+
+
+def _dump_citations(citations: Optional[List[Dict]]) -> Optional[str]:
+    # Compact separators: citations are the bulk of an assistant message row
+    return json.dumps(citations, ensure_ascii=False, separators=(',', ':')) if citations else None
+
+
+def chat_cursor(chat: Dict) -> str:
+    """Keyset cursor for get_all_chats and get_archived_chats pages ending with `chat`."""
+    return f"{chat['updated_at']}|{chat['id']}"
+
+
+def _parse_cursor(cursor: str) -> Tuple[str, str]:
+    """(updated_at, id) of a chat_cursor(); ValueError if it is malformed."""
+    updated_at, sep, chat_id = cursor.partition('|')
+    if not sep or not updated_at:
+        raise ValueError(f"Invalid chat cursor: {cursor!r}")
+    return updated_at, chat_id
+
 
 class ChatDB:
-    def __init__(self, db_path: str = "data/chathistory.db"):
-        """Initialize chat database connection."""
+    def __init__(self, db_path: str = "data/chathistory.db", archive_dir: Optional[str] = None):
+        """Initialize chat database connection; archived chats go to archive_dir."""
         self.db_path = db_path
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.archive = ChatArchive(archive_dir or str(Path(db_path).parent / "chat_archive"))
+        self._lock = threading.RLock()
+        # Streaming exports read archive segments from their snapshot; none is removed meanwhile
+        self._active_exports = 0
+        self._conn = self._connect()
         self._init_db()
-    
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,  # guarded by self._lock
+            cached_statements=STATEMENT_CACHE,
+            timeout=5.0,
+        )
+        conn.row_factory = sqlite3.Row
+        # Used by the messages_fts triggers: Arabic is indexed without tashkeel
+        conn.create_function("fold_diacritics", 1, strip_diacritics, deterministic=True)
+        # Only takes effect on a new database; vacuum() converts existing ones
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL lets readers run alongside the writer; NORMAL is durable across app crashes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
     def _init_db(self):
         """Create tables if they don't exist."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock:
+            conn = self._conn
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS chats (
                     id TEXT PRIMARY KEY,
                     title TEXT NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    message_count INTEGER NOT NULL DEFAULT 0
                 )
             """)
-            
+
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS messages (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -50,128 +136,896 @@ class ChatDB:
             except Exception:
                 # Ignore migration failure; better to continue than crash
                 pass
-            
+
+            # Denormalized message count: the first exchange and the chat list
+            # no longer need to count (or read) a chat's messages
+            cols = [row[1] for row in conn.execute("PRAGMA table_info(chats)").fetchall()]
+            if 'message_count' not in cols:
+                conn.execute("ALTER TABLE chats ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0")
+                conn.execute("""
+                    UPDATE chats SET message_count =
+                        (SELECT COUNT(*) FROM messages m WHERE m.chat_id = chats.id)
+                """)
+
+            # Messages are paged by (chat_id, id); id is the rowid, which every
+            # index entry already carries, so this index serves both the filter and the order
             conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_messages_chat_id 
+                CREATE INDEX IF NOT EXISTS idx_messages_chat_id
                 ON messages(chat_id)
             """)
-            
+
+            # Covering index for the sidebar listing: non-empty chats, newest first
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_chats_recent
+                ON chats(updated_at, id, title, created_at, message_count)
+                WHERE message_count > 0
+            """)
+
+            # Chats moved to the compressed archive: where to read each one back
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS archived_chats (
+                    id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP,
+                    message_count INTEGER NOT NULL,
+                    segment TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_archived_chats_recent
+                ON archived_chats(updated_at, id)
+            """)
+
+            self.fts_enabled = self._init_fts(conn)
             conn.commit()
-    
-    def create_chat(self, chat_id: str, title: str = "New Chat") -> bool:
-        """Create a new chat session."""
+
+    def _init_fts(self, conn: sqlite3.Connection) -> bool:
+        """Full-text index over messages.content, kept in sync by triggers.
+
+        External content: the index stores no copy of the text. Terms are
+        indexed after fold_diacritics, so writers to this database need that
+        function registered (ChatDB connections have it). Returns False if
+        this SQLite lacks FTS5; search is then unavailable.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone()
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(
+            # Diacritics count as word characters so that snippet(), which re-tokenizes
+            # the original text, sees the same token positions as the folded index
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    content, content='messages', content_rowid='id',
+                    tokenize="unicode61 remove_diacritics 2 tokenchars '{_DIACRITIC_CHARS}'"
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Chat search disabled, SQLite FTS5 unavailable: {e}")
+            return False
+        conn.executescript("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, fold_diacritics(new.content));
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content)
+                VALUES ('delete', old.id, fold_diacritics(old.content));
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content)
+                VALUES ('delete', old.id, fold_diacritics(old.content));
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, fold_diacritics(new.content));
+            END;
+        """)
+        if not exists:
+            # Index messages written before search existed ('rebuild' would skip the folding)
+            conn.execute(
+                "INSERT INTO messages_fts(rowid, content) SELECT id, fold_diacritics(content) FROM messages"
+            )
+        return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def create_chat(self, chat_id: str, title: str = "New Chat") -> bool:
+        """Create a new chat session; False if the id is taken (here or in the archive)."""
+        with self._lock:
+            # A chat lives in chats or archived_chats, never both
+            if self._conn.execute("SELECT 1 FROM archived_chats WHERE id = ?", (chat_id,)).fetchone():
+                return False
+            try:
+                self._conn.execute(
                     "INSERT INTO chats (id, title) VALUES (?, ?)",
                     (chat_id, title)
                 )
-                conn.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
-    
+                self._conn.commit()
+                return True
+            except sqlite3.IntegrityError:
+                self._conn.rollback()
+                return False
+
     def update_chat_title(self, chat_id: str, title: str) -> bool:
         """Update chat title."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
+        with self._lock:
+            cursor = self._conn.execute(
                 "UPDATE chats SET title = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
                 (title, chat_id)
             )
-            conn.commit()
+            self._conn.commit()
             return cursor.rowcount > 0
-    
+
     def add_message(
-        self, 
-        chat_id: str, 
-        role: str, 
+        self,
+        chat_id: str,
+        role: str,
         content: str,
         citations: Optional[List[Dict]] = None,
         is_fallback: bool = False,
         mode: Optional[str] = None
     ) -> int:
-        """Add a message to a chat."""
-        citations_json = json.dumps(citations) if citations else None
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                """INSERT INTO messages (chat_id, role, content, citations, is_fallback, mode)
-                   VALUES (?, ?, ?, ?, ?, ?)""",
-                (chat_id, role, content, citations_json, is_fallback, mode)
-            )
-            
-            # Update chat's updated_at
-            conn.execute(
-                "UPDATE chats SET updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-                (chat_id,)
-            )
-            
-            conn.commit()
+        """Add a message to a chat, creating the chat if needed."""
+        citations_json = _dump_citations(citations)
+
+        with self._lock:
+            self._restore_archived([chat_id])
+            try:
+                # messages.chat_id is a foreign key, so the chat row must exist first
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO chats (id, title) VALUES (?, 'New Chat')",
+                    (chat_id,)
+                )
+                cursor = self._conn.execute(
+                    """INSERT INTO messages (chat_id, role, content, citations, is_fallback, mode)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (chat_id, role, content, citations_json, is_fallback, mode)
+                )
+
+                # Update chat's updated_at and message count
+                self._conn.execute(
+                    "UPDATE chats SET updated_at = CURRENT_TIMESTAMP, message_count = message_count + 1 WHERE id = ?",
+                    (chat_id,)
+                )
+
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
             return cursor.lastrowid
-    
+
+    def record_exchange(
+        self,
+        chat_id: str,
+        question: str,
+        answer: str,
+        citations: Optional[List[Dict]] = None,
+        is_fallback: bool = False,
+        mode: Optional[str] = None,
+        title: Optional[str] = None,
+    ):
+        """Store a question and its answer in one transaction.
+
+        Creates the chat if needed and, when it had no messages yet, names it
+        `title`. Cost does not depend on how long the chat already is.
+        """
+        self.record_exchanges([{
+            'chat_id': chat_id, 'question': question, 'answer': answer, 'citations': citations,
+            'is_fallback': is_fallback, 'mode': mode, 'title': title,
+        }])
+
+    def record_exchanges(self, exchanges: List[Dict]):
+        """record_exchange for many exchanges (in order) in a single transaction."""
+        if not exchanges:
+            return
+        messages = []
+        for ex in exchanges:
+            citations_json = _dump_citations(ex.get('citations'))
+            messages.append((ex['chat_id'], "user", ex['question'], None, False, None))
+            messages.append((ex['chat_id'], "assistant", ex['answer'], citations_json,
+                             ex.get('is_fallback', False), ex.get('mode')))
+        with self._lock:
+            self._restore_archived({ex['chat_id'] for ex in exchanges})
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO chats (id, title) VALUES (?, 'New Chat')",
+                    [(ex['chat_id'],) for ex in exchanges]
+                )
+                self._conn.executemany(
+                    """INSERT INTO messages (chat_id, role, content, citations, is_fallback, mode)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    messages
+                )
+                # SET expressions see the old row, so message_count = 0 means "first exchange"
+                self._conn.executemany(
+                    """UPDATE chats
+                       SET title = CASE WHEN message_count = 0 AND ? IS NOT NULL THEN ? ELSE title END,
+                           message_count = message_count + 2,
+                           updated_at = CURRENT_TIMESTAMP
+                       WHERE id = ?""",
+                    [(ex.get('title'), ex.get('title'), ex['chat_id']) for ex in exchanges]
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
     def get_chat(self, chat_id: str) -> Optional[Dict]:
         """Get chat metadata."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute(
+        with self._lock:
+            cursor = self._conn.execute(
                 "SELECT * FROM chats WHERE id = ?",
                 (chat_id,)
             )
             row = cursor.fetchone()
-            return dict(row) if row else None
-    
-    def get_chat_messages(self, chat_id: str) -> List[Dict]:
-        """Get all messages for a chat."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute(
-                """SELECT id, role, content, citations, is_fallback, mode, created_at
-                   FROM messages 
-                   WHERE chat_id = ? 
-                   ORDER BY created_at ASC""",
+            if row:
+                return dict(row)
+            row = self._conn.execute(
+                "SELECT id, title, created_at, updated_at, message_count FROM archived_chats WHERE id = ?",
                 (chat_id,)
-            )
-            
-            messages = []
-            for row in cursor.fetchall():
-                msg = dict(row)
-                if msg['citations']:
-                    msg['citations'] = json.loads(msg['citations'])
-                messages.append(msg)
-            
-            return messages
-    
-    def get_all_chats(self, limit: int = 50) -> List[Dict]:
-        """Get all chats with at least one message, ordered by most recent."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute(
-                """SELECT c.id, c.title, c.created_at, c.updated_at
-                   FROM chats c
-                   WHERE EXISTS (SELECT 1 FROM messages m WHERE m.chat_id = c.id)
-                   ORDER BY c.updated_at DESC 
-                   LIMIT ?""",
-                (limit,)
+            ).fetchone()
+            return {**dict(row), 'archived': True} if row else None
+
+    def get_chat_messages(
+        self,
+        chat_id: str,
+        before_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        include_citations: bool = True,
+    ) -> List[Dict]:
+        """Get a chat's messages, oldest first.
+
+        With `limit`, returns only the newest `limit` messages older than
+        `before_id` (all messages when before_id is None); pass the first id
+        of a page as before_id to get the page before it.
+        """
+        citations = "citations" if include_citations else "NULL AS citations"
+        sql = f"""SELECT id, role, content, {citations}, is_fallback, mode, created_at
+                  FROM messages
+                  WHERE chat_id = ?"""
+        params: list = [chat_id]
+        if before_id is not None:
+            sql += " AND id < ?"
+            params.append(before_id)
+        if limit is not None:
+            # Newest page first, reversed below
+            sql += " ORDER BY id DESC LIMIT ?"
+            params.append(limit)
+        else:
+            sql += " ORDER BY id ASC"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            if not rows:
+                # A chat is either in the database or in the archive, never both
+                return self._archived_messages(chat_id, before_id, limit, include_citations)
+        if limit is not None:
+            rows.reverse()
+
+        messages = []
+        for row in rows:
+            msg = dict(row)
+            if msg['citations']:
+                msg['citations'] = json.loads(msg['citations'])
+            messages.append(msg)
+        return messages
+
+    def get_all_chats(self, limit: int = 50, cursor: Optional[str] = None) -> List[Dict]:
+        """Get chats with at least one message, most recent first.
+
+        `cursor` is chat_cursor() of the last chat of the previous page;
+        raises ValueError if it is malformed.
+        """
+        sql = """SELECT c.id, c.title, c.created_at, c.updated_at, c.message_count
+                 FROM chats c
+                 WHERE c.message_count > 0"""
+        params: list = []
+        if cursor:
+            # Row-value form: SQLite seeks idx_chats_recent to the cursor instead of scanning up to it
+            sql += " AND (c.updated_at, c.id) < (?, ?)"
+            params += list(_parse_cursor(cursor))
+        sql += " ORDER BY c.updated_at DESC, c.id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def search_messages(self, q: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Messages matching free-text q, best first, with a highlighted snippet.
+
+        Raises RuntimeError if full-text search is unavailable.
+        """
+        if not self.fts_enabled:
+            raise RuntimeError("Chat search is unavailable: this SQLite build has no FTS5")
+        match = _fts_query(q)
+        if match is None:
+            return []
+        with self._lock:
+            cursor = self._conn.execute(
+                """SELECT m.id AS message_id, m.chat_id, c.title AS chat_title, m.role, m.created_at,
+                          snippet(messages_fts, 0, '**', '**', '…', 16) AS snippet
+                   FROM messages_fts
+                   JOIN messages m ON m.id = messages_fts.rowid
+                   JOIN chats c ON c.id = m.chat_id
+                   WHERE messages_fts MATCH ?
+                   ORDER BY rank
+                   LIMIT ? OFFSET ?""",
+                (match, limit, offset)
             )
             return [dict(row) for row in cursor.fetchall()]
-    
+
     def delete_chat(self, chat_id: str) -> bool:
-        """Delete a chat and all its messages."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
-            conn.commit()
-            return cursor.rowcount > 0
-    
+        """Delete a chat and all its messages (an archived one's frame is reclaimed by vacuum())."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+            archived = self._conn.execute("DELETE FROM archived_chats WHERE id = ?", (chat_id,))
+            self._conn.commit()
+            return cursor.rowcount > 0 or archived.rowcount > 0
+
     def clear_all_chats(self) -> bool:
-        """Delete all chats and messages."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("DELETE FROM messages")
-            conn.execute("DELETE FROM chats")
-            conn.commit()
+        """Delete all chats and messages, including the archive."""
+        with self._lock:
+            self._conn.execute("DELETE FROM messages")
+            self._conn.execute("DELETE FROM chats")
+            self._conn.execute("DELETE FROM archived_chats")
+            self._conn.commit()
+            if not self._active_exports:
+                self.archive.clear()  # otherwise compact_archive() removes the orphans later
             return True
-    
+
+    # Export/import: NDJSON of {"type": "chat", ...} lines, each followed by its {"type": "message", ...} lines
+
+    def export_records(self, since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict]:
+        """Yield export records for chats updated in [since, until), archived ones included.
+
+        Reads through its own read-only connection inside one transaction, so the
+        export is a consistent snapshot, never blocks writers, and holds at most
+        one chat's messages in memory. Archive segments are not removed while it runs.
+        """
+        where, params = [], []
+        if since:
+            where.append("updated_at >= ?")
+            params.append(since)
+        if until:
+            where.append("updated_at < ?")
+            params.append(until)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        with self._lock:
+            self._active_exports += 1
+        conn = None
+        try:
+            conn = sqlite3.connect(f"file:{Path(self.db_path).resolve()}?mode=ro", uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("BEGIN")
+            chats = conn.execute(
+                f"SELECT id, title, created_at, updated_at FROM chats {clause} ORDER BY id", params
+            )
+            for chat in chats:
+                yield {'type': 'chat', **dict(chat)}
+                for m in conn.execute(
+                    """SELECT role, content, citations, is_fallback, mode, created_at
+                       FROM messages WHERE chat_id = ? ORDER BY id""",
+                    (chat['id'],)
+                ):
+                    yield self._message_record(chat['id'], dict(m))
+            archived = conn.execute(
+                f"SELECT id, segment, offset, length FROM archived_chats {clause} ORDER BY id", params
+            )
+            for row in archived:
+                chat = self.archive.read_chat(row['segment'], row['offset'], row['length'])
+                yield {'type': 'chat', **{k: chat[k] for k in ('id', 'title', 'created_at', 'updated_at')}}
+                for m in chat['messages']:
+                    yield self._message_record(chat['id'], m)
+            conn.execute("COMMIT")
+        finally:
+            if conn is not None:
+                conn.close()
+            with self._lock:
+                self._active_exports -= 1
+
+    @staticmethod
+    def _message_record(chat_id: str, m: Dict) -> Dict:
+        citations = m['citations']
+        if isinstance(citations, str):
+            citations = json.loads(citations)
+        return {
+            'type': 'message', 'chat_id': chat_id, 'role': m['role'], 'content': m['content'],
+            'citations': citations, 'is_fallback': bool(m['is_fallback']), 'mode': m['mode'],
+            'created_at': m['created_at'],
+        }
+
+    def import_batch(self, chats: List[Dict], messages: List[Dict], accepted: Set[str]) -> Tuple[int, int, int]:
+        """Insert one batch of import records in a transaction; returns (chats added, skipped, messages added).
+
+        Chats whose id already exists (here or in the archive) are skipped with
+        their messages. `accepted` collects the chats added so far, since a chat's
+        messages may arrive in later batches.
+        """
+        added = skipped = 0
+        with self._lock:
+            try:
+                for chat in chats:
+                    exists = self._conn.execute(
+                        "SELECT 1 FROM chats WHERE id = ? UNION ALL SELECT 1 FROM archived_chats WHERE id = ?",
+                        (chat['id'], chat['id'])
+                    ).fetchone()
+                    if exists or chat['id'] in accepted:
+                        skipped += 1
+                        continue
+                    self._conn.execute(
+                        """INSERT INTO chats (id, title, created_at, updated_at)
+                           VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))""",
+                        (chat['id'], chat.get('title') or 'New Chat', chat.get('created_at'), chat.get('updated_at'))
+                    )
+                    accepted.add(chat['id'])
+                    added += 1
+                rows = [
+                    (m['chat_id'], m['role'], m['content'], _dump_citations(m.get('citations')),
+                     bool(m.get('is_fallback')), m.get('mode'), m.get('created_at'))
+                    for m in messages if m['chat_id'] in accepted
+                ]
+                self._conn.executemany(
+                    """INSERT INTO messages (chat_id, role, content, citations, is_fallback, mode, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))""",
+                    rows
+                )
+                counts: Dict[str, int] = {}
+                for row in rows:
+                    counts[row[0]] = counts.get(row[0], 0) + 1
+                # Leaves updated_at as exported
+                self._conn.executemany(
+                    "UPDATE chats SET message_count = message_count + ? WHERE id = ?",
+                    [(n, chat_id) for chat_id, n in counts.items()]
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return added, skipped, len(rows)
+
+    # Retention: chats idle for longer than a threshold move to the compressed archive
+
+    def archive_chats(self, older_than_days: int, batch_size: int = 200) -> int:
+        """Archive up to batch_size chats last updated more than older_than_days ago.
+
+        Chats without messages are deleted instead. Returns how many were archived;
+        call again until it returns less than batch_size.
+        """
+        cutoff = f"-{int(older_than_days)} days"
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM chats WHERE message_count = 0 AND updated_at < datetime('now', ?)", (cutoff,)
+            )
+            self._conn.commit()
+            chats = [dict(row) for row in self._conn.execute(
+                """SELECT id, title, created_at, updated_at, message_count FROM chats
+                   WHERE message_count > 0 AND updated_at < datetime('now', ?)
+                   ORDER BY updated_at LIMIT ?""",
+                (cutoff, batch_size)
+            )]
+            if not chats:
+                return 0
+            for chat in chats:
+                messages = self._conn.execute(
+                    """SELECT id, role, content, citations, is_fallback, mode, created_at
+                       FROM messages WHERE chat_id = ? ORDER BY id""",
+                    (chat['id'],)
+                ).fetchall()
+                chat['messages'] = [
+                    {**dict(m), 'citations': json.loads(m['citations']) if m['citations'] else None}
+                    for m in messages
+                ]
+            # The segment is on disk (fsynced) before anything is deleted
+            segment, positions = self.archive.write_segment(chats)
+            try:
+                self._conn.executemany(
+                    """INSERT OR REPLACE INTO archived_chats
+                       (id, title, created_at, updated_at, message_count, segment, offset, length)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    [(c['id'], c['title'], c['created_at'], c['updated_at'], c['message_count'], segment, off, length)
+                     for c, (off, length) in zip(chats, positions)]
+                )
+                self._conn.executemany("DELETE FROM chats WHERE id = ?", [(c['id'],) for c in chats])
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            return len(chats)
+
+    def compact_archive(self) -> int:
+        """Reclaim archive space of deleted and restored chats; returns bytes freed.
+
+        Segments no archived chat points to are removed; those mostly made of
+        such dead frames get their live frames copied to a new segment. Does
+        nothing while an export is streaming from the archive.
+        """
+        with self._lock:
+            if self._active_exports:
+                return 0
+            live = {row['segment']: row['used'] for row in self._conn.execute(
+                "SELECT segment, SUM(length) AS used FROM archived_chats GROUP BY segment"
+            )}
+            freed = 0
+            for name, size in self.archive.segments().items():
+                used = live.get(name, 0)
+                if not used:
+                    # Also a segment (or .tmp) left by a crash before its rows were committed
+                    self.archive.remove(name)
+                    freed += size
+                    continue
+                if size - used < size * ARCHIVE_COMPACT_RATIO:
+                    continue
+                rows = self._conn.execute(
+                    "SELECT id, offset, length FROM archived_chats WHERE segment = ? ORDER BY offset", (name,)
+                ).fetchall()
+                segment, positions = self.archive.copy_frames(name, [(r['offset'], r['length']) for r in rows])
+                try:
+                    self._conn.executemany(
+                        "UPDATE archived_chats SET segment = ?, offset = ? WHERE id = ?",
+                        [(segment, off, r['id']) for r, (off, _) in zip(rows, positions)]
+                    )
+                    self._conn.commit()
+                except Exception:
+                    self._conn.rollback()
+                    self.archive.remove(segment)
+                    raise
+                self.archive.remove(name)
+                freed += size - used
+            return freed
+
+    def vacuum(self, max_pages: int = 0) -> int:
+        """Return free pages to the filesystem (all of them if max_pages is 0); returns pages freed.
+
+        A database created before auto_vacuum=INCREMENTAL is rebuilt once with VACUUM.
+        The chat archive is compacted first.
+        """
+        with self._lock:
+            archive_freed = self.compact_archive()
+            if archive_freed:
+                logger.info(f"Chat archive: freed {archive_freed} bytes of deleted or restored chats")
+            if self._conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                logger.info("Converting chat history to incremental auto-vacuum (one-time VACUUM)")
+                before = self._conn.execute("PRAGMA page_count").fetchone()[0]
+                self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                self._conn.execute("VACUUM")
+                # The rebuild adds pointer-map pages, so a nearly full database can grow slightly
+                return max(0, before - self._conn.execute("PRAGMA page_count").fetchone()[0])
+            free = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # executescript steps the pragma to completion (execute would free one page)
+            self._conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+            return free - self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def get_archived_chats(self, limit: int = 50, cursor: Optional[str] = None) -> List[Dict]:
+        """Archived chats, most recent first; paged like get_all_chats."""
+        sql = """SELECT id, title, created_at, updated_at, message_count FROM archived_chats"""
+        params: list = []
+        if cursor:
+            sql += " WHERE (updated_at, id) < (?, ?)"
+            params += list(_parse_cursor(cursor))
+        sql += " ORDER BY updated_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            return [{**dict(row), 'archived': True} for row in cursor.fetchall()]
+
+    def _read_archived(self, chat_id: str) -> Optional[Dict]:
+        row = self._conn.execute(
+            "SELECT segment, offset, length FROM archived_chats WHERE id = ?", (chat_id,)
+        ).fetchone()
+        return self.archive.read_chat(row['segment'], row['offset'], row['length']) if row else None
+
+    def _archived_messages(
+        self, chat_id: str, before_id: Optional[int], limit: Optional[int], include_citations: bool
+    ) -> List[Dict]:
+        """get_chat_messages for an archived chat, with the same paging."""
+        chat = self._read_archived(chat_id)
+        if chat is None:
+            return []
+        messages = chat['messages']
+        if before_id is not None:
+            messages = [m for m in messages if m['id'] < before_id]
+        if limit is not None:
+            messages = messages[-limit:] if limit > 0 else []
+        if not include_citations:
+            messages = [{**m, 'citations': None} for m in messages]
+        return messages
+
+    def _restore_archived(self, chat_ids):
+        """Move archived chats among chat_ids back into the database before they are written to."""
+        ids = list(chat_ids)
+        marks = ','.join('?' * len(ids))
+        archived = [row[0] for row in self._conn.execute(
+            f"SELECT id FROM archived_chats WHERE id IN ({marks})", ids
+        )]
+        for chat_id in archived:
+            chat = self._read_archived(chat_id)
+            try:
+                self._conn.execute(
+                    """INSERT OR IGNORE INTO chats (id, title, created_at, updated_at, message_count)
+                       VALUES (?, ?, ?, ?, ?)""",
+                    (chat['id'], chat['title'], chat['created_at'], chat['updated_at'], chat['message_count'])
+                )
+                # Original ids: AUTOINCREMENT never hands them out again
+                self._conn.executemany(
+                    """INSERT OR IGNORE INTO messages (id, chat_id, role, content, citations, is_fallback, mode, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    [(m['id'], chat_id, m['role'], m['content'], _dump_citations(m['citations']),
+                      m['is_fallback'], m['mode'], m['created_at']) for m in chat['messages']]
+                )
+                self._conn.execute("DELETE FROM archived_chats WHERE id = ?", (chat_id,))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
     def get_chat_count(self) -> int:
         """Get total number of chats."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT COUNT(*) FROM chats")
+        with self._lock:
+            cursor = self._conn.execute("SELECT COUNT(*) FROM chats")
             return cursor.fetchone()[0]
+
+
+class ImportLineTooLong(ValueError):
+    """An import line exceeds MAX_IMPORT_LINE_BYTES."""
+
+
+class AsyncChatDB:
+    """Awaitable ChatDB: calls run in order on one dedicated thread.
+
+    A single thread matches the single connection, so calls never contend for
+    the lock and writes are applied in the order requests issued them.
+
+    With write-behind started, enqueue_exchange returns at once and exchanges
+    are written in batches every `flush_interval` seconds (or as soon as
+    `max_batch` are waiting). Every other call flushes first, so readers
+    always see their own writes.
+
+    The last `tail_size` messages of up to `tail_chats` recently used chats are
+    kept in memory (LRU) and updated on every write, so get_recent_messages
+    usually needs no database read.
+    """
+
+    def __init__(
+        self,
+        db: ChatDB,
+        flush_interval: float = 0.25,
+        max_batch: int = 256,
+        tail_size: int = 6,
+        tail_chats: int = 1024,
+    ):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.tail_size = tail_size
+        self.tail_chats = tail_chats
+        # chat_id -> (last messages, whether older messages are known to be absent or loaded)
+        self._tails: "OrderedDict[str, Tuple[Deque[Dict], bool]]" = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chatdb')
+        self._pending: Deque[Dict] = deque()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._retention_task: Optional[asyncio.Task] = None
+
+    def _remember(self, chat_id: str, messages: List[Dict], complete: bool = False):
+        entry = self._tails.get(chat_id)
+        if entry is None:
+            entry = (deque(maxlen=self.tail_size), complete)
+        elif complete and not entry[1]:
+            entry = (entry[0], True)
+        entry[0].extend({'role': m['role'], 'content': m['content']} for m in messages)
+        self._tails[chat_id] = entry
+        self._tails.move_to_end(chat_id)
+        while len(self._tails) > self.tail_chats:
+            self._tails.popitem(last=False)
+
+    def _remember_exchange(self, chat_id: str, question: str, answer: str):
+        self._remember(chat_id, [{'role': 'user', 'content': question}, {'role': 'assistant', 'content': answer}])
+
+    async def get_recent_messages(self, chat_id: str, n: Optional[int] = None) -> List[Dict]:
+        """Last n (at most tail_size) messages of a chat as {'role', 'content'}, oldest first."""
+        n = min(n or self.tail_size, self.tail_size)
+        entry = self._tails.get(chat_id)
+        if entry is not None and (entry[1] or len(entry[0]) >= n):
+            self._tails.move_to_end(chat_id)
+            return list(entry[0])[-n:]
+        self._tails.pop(chat_id, None)
+        rows = await self._run(self.db.get_chat_messages, chat_id, limit=self.tail_size, include_citations=False)
+        if chat_id not in self._tails:  # else a write raced the load; its partial tail stays
+            self._remember(chat_id, rows, complete=True)
+        return [{'role': m['role'], 'content': m['content']} for m in rows[-n:]]
+
+    async def _call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def _run(self, fn, *args, **kwargs):
+        await self.flush()
+        return await self._call(fn, *args, **kwargs)
+
+    @property
+    def pending(self) -> int:
+        """Exchanges waiting to be written."""
+        return len(self._pending)
+
+    def start(self):
+        """Start the write-behind flusher on the running loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    def start_retention(self, older_than_days: int, interval_seconds: float):
+        """Archive chats idle for older_than_days every interval_seconds (first run right away)."""
+        if self._retention_task is None and older_than_days > 0:
+            self._retention_task = asyncio.create_task(self._retention_loop(older_than_days, interval_seconds))
+
+    async def stop(self):
+        """Stop the background tasks and write everything still queued."""
+        for task in (self._task, self._retention_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._retention_task = None
+        await self.flush()
+
+    async def apply_retention(self, older_than_days: int, batch_size: int = 200) -> int:
+        """Archive chats idle for older_than_days, then reclaim the freed pages; returns chats archived."""
+        total = 0
+        while True:
+            # One batch per call so chat requests are served in between
+            archived = await self._run(self.db.archive_chats, older_than_days, batch_size)
+            total += archived
+            if archived < batch_size:
+                break
+        freed = await self._call(self.db.vacuum)
+        if total or freed:
+            logger.info(f"Chat retention: archived {total} chats, freed {freed} pages")
+        return total
+
+    async def _retention_loop(self, older_than_days: int, interval_seconds: float):
+        while True:
+            try:
+                await self.apply_retention(older_than_days)
+            except Exception as e:
+                logger.error(f"Chat retention failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    async def enqueue_exchange(self, chat_id: str, question: str, answer: str, **kwargs):
+        """Queue an exchange for the next batch (written immediately if write-behind is off)."""
+        if self._task is None:
+            return await self.record_exchange(chat_id, question, answer, **kwargs)
+        self._remember_exchange(chat_id, question, answer)
+        self._pending.append({'chat_id': chat_id, 'question': question, 'answer': answer, **kwargs})
+        if len(self._pending) >= 4 * self.max_batch:
+            await self.flush()  # back-pressure when writes fall behind
+        elif len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+                try:
+                    await self._call(self.db.record_exchanges, batch)
+                except Exception as e:
+                    # Keep the good ones: retry one by one and drop only what still fails
+                    logger.error(f"Chat history batch of {len(batch)} failed ({e}); retrying individually")
+                    for ex in batch:
+                        try:
+                            await self._call(self.db.record_exchanges, [ex])
+                        except Exception as e:
+                            logger.error(f"Dropping chat exchange for {ex['chat_id']}: {e}")
+                            self._tails.pop(ex['chat_id'], None)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def create_chat(self, chat_id: str, title: str = "New Chat") -> bool:
+        created = await self._run(self.db.create_chat, chat_id, title)
+        if created:
+            self._tails.pop(chat_id, None)
+            self._remember(chat_id, [], complete=True)
+        return created
+
+    async def update_chat_title(self, chat_id: str, title: str) -> bool:
+        return await self._run(self.db.update_chat_title, chat_id, title)
+
+    async def add_message(self, chat_id: str, role: str, content: str, **kwargs) -> int:
+        message_id = await self._run(self.db.add_message, chat_id, role, content, **kwargs)
+        self._remember(chat_id, [{'role': role, 'content': content}])
+        return message_id
+
+    async def record_exchange(self, chat_id: str, question: str, answer: str, **kwargs):
+        await self._run(self.db.record_exchange, chat_id, question, answer, **kwargs)
+        self._remember_exchange(chat_id, question, answer)
+
+    async def get_chat(self, chat_id: str) -> Optional[Dict]:
+        return await self._run(self.db.get_chat, chat_id)
+
+    async def get_chat_messages(self, chat_id: str, **kwargs) -> List[Dict]:
+        return await self._run(self.db.get_chat_messages, chat_id, **kwargs)
+
+    async def get_all_chats(self, limit: int = 50, cursor: Optional[str] = None) -> List[Dict]:
+        return await self._run(self.db.get_all_chats, limit, cursor)
+
+    async def search_messages(self, q: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        return await self._run(self.db.search_messages, q, limit, offset)
+
+    async def import_ndjson(self, chunks: AsyncIterator[bytes]) -> Dict:
+        """Import an export stream, committing every IMPORT_BATCH_LINES lines; returns counts.
+
+        Raises ImportLineTooLong, after committing the lines before it, if a line
+        exceeds MAX_IMPORT_LINE_BYTES, so a body without newlines is never buffered whole.
+        """
+        stats = {'chats_imported': 0, 'chats_skipped': 0, 'messages_imported': 0, 'invalid_lines': 0}
+        accepted: Set[str] = set()
+        chats: List[Dict] = []
+        messages: List[Dict] = []
+
+        async def write_batch():
+            added, skipped, written = await self._run(self.db.import_batch, chats, messages, accepted)
+            stats['chats_imported'] += added
+            stats['chats_skipped'] += skipped
+            stats['messages_imported'] += written
+            chats.clear()
+            messages.clear()
+
+        def parse(line: bytes):
+            try:
+                record = json.loads(line)
+                if record.get('type') == 'chat' and isinstance(record.get('id'), str):
+                    chats.append(record)
+                elif (record.get('type') == 'message' and isinstance(record.get('chat_id'), str)
+                      and record.get('role') and isinstance(record.get('content'), str)):
+                    messages.append(record)
+                else:
+                    raise ValueError('not a chat or message record')
+            except (ValueError, AttributeError, TypeError):
+                stats['invalid_lines'] += 1
+
+        buffer = b''
+        line_no = 0
+        async for chunk in chunks:
+            buffer += chunk
+            *lines, buffer = buffer.split(b'\n')
+            if len(buffer) > MAX_IMPORT_LINE_BYTES:
+                lines.append(buffer)  # unfinished, but already too long
+            for line in lines:
+                line_no += 1
+                if len(line) > MAX_IMPORT_LINE_BYTES:
+                    await write_batch()
+                    raise ImportLineTooLong(f"line {line_no} is longer than {MAX_IMPORT_LINE_BYTES} bytes")
+                if line.strip():
+                    parse(line)
+                    if len(chats) + len(messages) >= IMPORT_BATCH_LINES:
+                        await write_batch()
+        if buffer.strip():
+            parse(buffer)
+        await write_batch()
+        return stats
+
+    async def get_archived_chats(self, limit: int = 50, cursor: Optional[str] = None) -> List[Dict]:
+        return await self._run(self.db.get_archived_chats, limit, cursor)
+
+    async def delete_chat(self, chat_id: str) -> bool:
+        self._tails.pop(chat_id, None)
+        return await self._run(self.db.delete_chat, chat_id)
+
+    async def clear_all_chats(self) -> bool:
+        self._tails.clear()
+        return await self._run(self.db.clear_all_chats)
+
+    async def get_chat_count(self) -> int:
+        return await self._run(self.db.get_chat_count)
+
+    def close(self):
+        """Finish queued calls, then close the connection (call stop() first to flush)."""
+        self._executor.shutdown(wait=True)
+        self.db.close()
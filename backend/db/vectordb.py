@@ -1,11 +1,26 @@
+import json
 import os
-from typing import Iterable, List, Dict
+import re
+import threading
+import time
+from typing import Iterable, List, Dict, Optional
 import chromadb
 from chromadb.utils import embedding_functions
 from backend.core.config import settings
 
 _client = None
 _collection = None
+_web_collection = None
+
+COLLECTION = "islamic_texts"
+WEB_COLLECTION = "web_chunks"
+
+# Which collection serves queries, and the embedding model that built it.
+# Re-embedding builds a new collection and flips this pointer in one step.
+ACTIVE_POINTER = "active_collection.json"
+_active: Optional[Dict] = None
+_active_mtime: Optional[int] = None
+_lock = threading.Lock()
 
 # We'll manage embeddings manually; Chroma will store them.
 
@@ -18,21 +33,96 @@ def get_client():
     return _client
 
 
+def _pointer_path() -> str:
+    return os.path.join(settings.vectordb_dir, ACTIVE_POINTER)
+
+
+def get_active_index() -> Dict:
+    """{'collection', 'embedding_model'} currently serving queries.
+
+    Without a pointer file this is the original collection built with the
+    configured model. The file is re-read when its mtime changes, so every
+    worker process follows a switch.
+    """
+    global _active, _active_mtime, _collection
+    try:
+        mtime = os.stat(_pointer_path()).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    with _lock:
+        if _active is not None and mtime == _active_mtime:
+            return _active
+        active = {'collection': COLLECTION, 'embedding_model': settings.embedding_model}
+        if mtime is not None:
+            try:
+                with open(_pointer_path(), encoding='utf-8') as f:
+                    active = json.load(f)
+            except (OSError, ValueError):
+                if _active is not None:
+                    return _active  # mid-write on a platform without atomic replace; keep the old one
+        if _active is None or active['collection'] != _active['collection']:
+            _collection = None
+        _active, _active_mtime = active, mtime
+        return _active
+
+
+def get_active_embedding_model() -> str:
+    return get_active_index()['embedding_model']
+
+
 def get_collection():
     global _collection
-    if _collection is None:
-        client = get_client()
-        _collection = client.get_or_create_collection(name="islamic_texts")
-    return _collection
+    name = get_active_index()['collection']
+    with _lock:
+        if _collection is None:
+            _collection = get_client().get_or_create_collection(name=name)
+        return _collection
 
 
-def reset_collection():
-    client = get_client()
+def switch_collection(name: str, embedding_model: str):
+    """Atomically point queries (in every process) at another collection."""
+    global _active, _active_mtime, _collection
+    collection = get_client().get_collection(name=name)
+    os.makedirs(settings.vectordb_dir, exist_ok=True)
+    path = _pointer_path()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with _lock:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'collection': name, 'embedding_model': embedding_model, 'switched_at': time.time()}, f)
+        os.replace(tmp, path)
+        _active = {'collection': name, 'embedding_model': embedding_model}
+        _active_mtime = os.stat(path).st_mtime_ns
+        _collection = collection
+
+
+def versioned_collection_name(embedding_model: str) -> str:
+    slug = re.sub(r'[^a-zA-Z0-9]+', '-', embedding_model).strip('-')[:32] or 'model'
+    return f"{COLLECTION}-{slug}-{int(time.time())}"
+
+
+def create_collection(name: str):
+    return get_client().create_collection(name=name)
+
+
+def drop_collection(name: str):
     try:
-        client.delete_collection("islamic_texts")
+        get_client().delete_collection(name)
     except Exception:
         pass
-    return client.create_collection(name="islamic_texts")
+
+
+def reset_collection(embedding_model: Optional[str] = None):
+    """Empty the active collection; optionally record a new model for it."""
+    global _collection
+    name = get_active_index()['collection']
+    client = get_client()
+    drop_collection(name)
+    # Replace the cached handle too, or callers keep using the deleted collection
+    with _lock:
+        _collection = client.create_collection(name=name)
+    if embedding_model and embedding_model != get_active_embedding_model():
+        switch_collection(name, embedding_model)
+    return _collection
 
 
 def add_texts(ids: List[str], texts: List[str], metadatas: List[Dict], embeddings: List[List[float]]):
@@ -40,6 +130,16 @@ def add_texts(ids: List[str], texts: List[str], metadatas: List[Dict], embedding
     collection.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
 
 
+def upsert_texts(ids: List[str], texts: List[str], metadatas: List[Dict], embeddings: List[List[float]]):
+    collection = get_collection()
+    collection.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+
+
+def delete_by_source(source: str):
+    collection = get_collection()
+    collection.delete(where={"source": source})
+
+
 def query_texts(query_embedding: List[float], top_k: int):
     collection = get_collection()
     res = collection.query(query_embeddings=[query_embedding], n_results=top_k)
@@ -53,3 +153,51 @@ def query_texts(query_embedding: List[float], top_k: int):
             'distance': res['distances'][0][i],
         })
     return results
+
+
+def get_web_collection():
+    """Separate collection for promoted web chunks (never mixed with ingested texts)."""
+    global _web_collection
+    if _web_collection is None:
+        client = get_client()
+        # Cosine space so 1 - distance matches the similarity thresholds used for live web chunks
+        _web_collection = client.get_or_create_collection(name=WEB_COLLECTION, metadata={"hnsw:space": "cosine"})
+    return _web_collection
+
+
+def upsert_web_texts(ids: List[str], texts: List[str], metadatas: List[Dict], embeddings: List[List[float]]):
+    collection = get_web_collection()
+    collection.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+
+
+def query_web_texts(query_embedding: List[float], top_k: int, now: float):
+    """Nearest web chunks that have not expired yet."""
+    collection = get_web_collection()
+    if collection.count() == 0:
+        return []
+    res = collection.query(
+        query_embeddings=[query_embedding],
+        n_results=top_k,
+        where={"expires_at": {"$gt": now}},
+    )
+    results = []
+    for i in range(len(res['ids'][0])):
+        results.append({
+            'id': res['ids'][0][i],
+            'text': res['documents'][0][i],
+            'metadata': res['metadatas'][0][i],
+            'distance': res['distances'][0][i],
+        })
+    return results
+
+
+def reset_web_collection():
+    """Drop stored web chunks, e.g. after the embedding model changed."""
+    global _web_collection
+    drop_collection(WEB_COLLECTION)
+    _web_collection = None
+
+
+def delete_expired_web_texts(now: float):
+    collection = get_web_collection()
+    collection.delete(where={"expires_at": {"$lte": now}})
@@ -0,0 +1,143 @@
+"""
+Persistent web page cache using SQLite.
+Stores cleaned page text, chunk texts and their embeddings so repeat fetches
+(across restarts and uvicorn workers) skip both download and re-embedding.
+"""
+import sqlite3
+import json
+import time
+from pathlib import Path
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from backend.services.scoring import normalize_rows
+
+
+class WebCache:
+    def __init__(self, db_path: str, max_bytes: int):
+        """Initialize the cache database; total stored bytes are kept under max_bytes."""
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Several workers may share the file; wait briefly on writer locks instead of failing
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        """Create tables if they don't exist."""
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    text TEXT NOT NULL,
+                    chunks TEXT NOT NULL,
+                    embeddings BLOB,
+                    dim INTEGER NOT NULL DEFAULT 0,
+                    size INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_pages_accessed_at
+                ON pages(accessed_at, size)
+            """)
+            conn.commit()
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Return the cached entry for url (marking it recently used), or None."""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                """SELECT url, etag, last_modified, text, chunks, embeddings, dim, fetched_at
+                   FROM pages WHERE url = ?""",
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            conn.commit()
+
+        chunks = json.loads(row['chunks'])
+        if row['embeddings'] and row['dim']:
+            matrix = np.frombuffer(row['embeddings'], dtype=np.float32).reshape(-1, row['dim'])
+            # Rows written before vectors were normalized at fetch time are raw;
+            # rank_chunks expects unit length, and renormalizing is a no-op otherwise
+            matrix = normalize_rows(matrix)
+            for chunk, vec in zip(chunks, matrix):
+                chunk['embedding'] = vec
+        return {
+            'url': row['url'],
+            'etag': row['etag'],
+            'last_modified': row['last_modified'],
+            'text': row['text'],
+            'chunks': chunks,
+            'fetched_at': row['fetched_at'],
+        }
+
+    def put(
+        self,
+        url: str,
+        text: str,
+        chunks: List[Dict],
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        """Store a page; chunks are dicts with 'text', 'chunk_index' and 'embedding'."""
+        vectors = [c['embedding'] for c in chunks if c.get('embedding') is not None]
+        blob, dim = None, 0
+        if vectors and len(vectors) == len(chunks):
+            matrix = np.asarray(vectors, dtype=np.float32)
+            blob, dim = matrix.tobytes(), matrix.shape[1]
+        chunks_json = json.dumps(
+            [{'text': c['text'], 'chunk_index': c['chunk_index']} for c in chunks],
+            separators=(',', ':')
+        )
+        size = len(text.encode('utf-8')) + len(chunks_json.encode('utf-8')) + (len(blob) if blob else 0)
+        now = time.time()
+
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO pages
+                   (url, etag, last_modified, text, chunks, embeddings, dim, size, fetched_at, accessed_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (url, etag, last_modified, text, chunks_json, blob, dim, size, now, now)
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def mark_validated(self, url: str):
+        """Record a successful revalidation (304 Not Modified) so the TTL restarts."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                (now, now, url)
+            )
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used pages until the cache fits in max_bytes."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute("SELECT url, size FROM pages ORDER BY accessed_at ASC").fetchall()
+        victims = []
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            victims.append((url,))
+            total -= size
+        conn.executemany("DELETE FROM pages WHERE url = ?", victims)
+
+    def clear(self):
+        """Delete all cached pages."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM pages")
+            conn.commit()
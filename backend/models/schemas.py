@@ -13,7 +13,7 @@ class AskRequest(BaseModel):
     chat_id: Optional[str] = None  # For chat history
     use_web: Optional[bool] = False  # If true, attempt web augmentation
     web_urls: Optional[List[str]] = None  # Explicit URLs to fetch and augment
-    conversation_history: Optional[List[ConversationMessage]] = None  # Last few messages for follow-up detection
+    conversation_history: Optional[List[ConversationMessage]] = None  # Last few messages for follow-up detection; loaded from chat_id history when omitted
     source_mode: Optional[str] = Field(
         default="rag",
         description="Answer source mode: 'rag', 'rag+internet', 'rag+llm', 'internet', 'llm'"
@@ -40,9 +40,17 @@ class AskResponse(BaseModel):
 class IngestRequest(BaseModel):
     path: str
     reset: bool = False
-    batch_size: int = 32
-    chunk_size: int = 800
-    chunk_overlap: int = 200
+    batch_size: int = Field(32, ge=1)
+    chunk_size: int = Field(800, ge=1)
+    chunk_overlap: int = Field(200, ge=0)
+    workers: Optional[int] = Field(None, ge=1)  # parser processes (default: CPU count - 1)
+    embed_concurrency: Optional[int] = Field(None, ge=1)  # embedding batches in flight
+    dedup_threshold: Optional[float] = Field(None, ge=0, le=1)  # near-duplicate Jaccard cutoff (0 = off)
+
+class ReembedRequest(BaseModel):
+    embedding_model: Optional[str] = None  # default: settings.embedding_model
+    batch_size: int = Field(32, ge=1)
+    embed_concurrency: Optional[int] = Field(None, ge=1)
 
 # Chat History Models
 
@@ -55,6 +63,16 @@ class ChatResponse(BaseModel):
     title: str
     created_at: str
     updated_at: str
+    message_count: int = 0
+    archived: bool = False  # stored in the compressed archive; restored on the next message
+
+class ChatSearchResult(BaseModel):
+    message_id: int
+    chat_id: str
+    chat_title: str
+    role: str
+    created_at: str
+    snippet: str  # matched terms wrapped in ** **
 
 class MessageResponse(BaseModel):
     id: int
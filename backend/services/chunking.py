@@ -0,0 +1,229 @@
+"""
+Structure-aware text chunking shared by ingest and web augmentation.
+Chunks end on paragraph, heading, sentence or verse boundaries (Latin and
+Arabic punctuation) and are sized by estimated tokens. Boundaries and sizes
+are found with numpy over the text's code points, so no word lists are built.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+# Bump when chunk boundaries change so the ingest manifest re-indexes
+CHUNKER_VERSION = 1
+
+# Estimated tokens are counted in 1/UNITS steps to keep the cumsum integral:
+# ~4 chars per token for Latin script, ~2.5 for Arabic, whitespace is free.
+UNITS = 20
+_ARABIC_RANGES = ((0x0600, 0x06FF), (0x0750, 0x077F), (0x08A0, 0x08FF), (0xFB50, 0xFDFF), (0xFE70, 0xFEFF))
+
+# Character classes, looked up per code point (anything past the BMP is "other")
+_WS, _END, _CLOSER, _ORNATE, _AYAH, _DIGIT = 1, 2, 4, 8, 16, 32
+_NEWLINE, _HASH = ord('\n'), ord('#')
+# Characters stepped over one at a time before scanning the whole text instead
+_MAX_SCAN_STEPS = 16
+
+
+def _build_tables():
+    weight = np.full(0x10000, 5, dtype=np.uint8)
+    for lo, hi in _ARABIC_RANGES:
+        weight[lo:hi + 1] = 8
+    kind = np.zeros(0x10000, dtype=np.uint8)
+    for chars, flag in (
+        ('\t\n\v\f\r \xa0\u2028\u2029\u3000', _WS),
+        ('.!?؟۔', _END),  # incl. Arabic question mark and Urdu full stop
+        ('"\')]»”’', _CLOSER),
+        ('﴾﴿', _ORNATE),  # ornate parentheses around verse numbers
+        ('۝', _AYAH),  # end of ayah
+        ('0123456789٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', _DIGIT),
+    ):
+        for c in chars:
+            kind[ord(c)] |= flag
+    weight[kind & _WS > 0] = 0
+    return weight, kind
+
+
+_WEIGHT, _KIND = _build_tables()
+_MAX_WEIGHT = int(_WEIGHT.max())
+
+
+def _code_points(text: str) -> np.ndarray:
+    """Code points of text in the narrowest dtype; past the BMP they read as 0xFFFF."""
+    if text.isascii():
+        return np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    units = np.frombuffer(text.encode('utf-16-le', 'surrogatepass'), dtype=np.uint16)
+    if not ((units & 0xF800) == 0xD800).any():
+        return units
+    cps = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    return np.minimum(cps, 0xFFFF).astype(np.uint16)
+
+
+def _classify(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Code points of text and their character-class flags."""
+    cps = _code_points(text)
+    return cps, _KIND[cps]
+
+
+def _token_cumsum(cps: np.ndarray) -> np.ndarray:
+    """cum[i] = estimated tokens (in 1/UNITS) of text[:i]; length len(text) + 1."""
+    # int32 halves the memory traffic and holds any text under ~268M characters
+    dtype = np.int32 if cps.size * _MAX_WEIGHT < 2 ** 31 else np.int64
+    cum = np.zeros(cps.size + 1, dtype=dtype)
+    np.cumsum(_WEIGHT[cps], out=cum[1:], dtype=dtype)
+    return cum
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of text for sizing chunks."""
+    if not text:
+        return 0
+    cps, _ = _classify(text)
+    return int(_token_cumsum(cps)[-1]) // UNITS
+
+
+def _scan(pos: np.ndarray, n: int, hit, everywhere) -> np.ndarray:
+    """For each offset in pos, the first offset at or after it where hit() holds (n if none).
+
+    hit(offsets) tests a few offsets; the answer is usually a step or two away,
+    so only after _MAX_SCAN_STEPS is everywhere() (all hits in the text) computed.
+    """
+    out = pos.copy()
+    pending = np.flatnonzero(out < n)
+    for _ in range(_MAX_SCAN_STEPS):
+        if not pending.size:
+            return np.minimum(out, n)
+        pending = pending[~hit(out[pending])]
+        out[pending] += 1
+        pending = pending[out[pending] < n]
+    if pending.size:
+        hits = everywhere()
+        out[pending] = np.append(hits, n)[np.searchsorted(hits, out[pending])]
+    return np.minimum(out, n)
+
+
+def _word_starts(is_ws: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    """Offsets in (lo, hi] where a word starts."""
+    return np.flatnonzero(is_ws[lo:hi] > is_ws[lo + 1:hi + 1]) + lo + 1
+
+
+def _boundaries(cps: np.ndarray, kind: np.ndarray, is_ws: np.ndarray) -> np.ndarray:
+    """Word-start offsets where a chunk may end.
+
+    That is after a blank line, before a Markdown heading, after a sentence end
+    (optionally closed by a quote or bracket), and after a verse marker: ۝ or
+    an ornate parenthesis closing a verse number.
+    """
+    n = cps.size
+    # Punctuation is sparse: find it once and look only at its neighbours
+    marks = np.flatnonzero(kind & (_END | _CLOSER | _ORNATE | _AYAH))
+    flags = kind[marks]
+    prev = kind[np.maximum(marks - 1, 0)]
+    prev[marks == 0] = 0
+    after = marks + 1 < n
+    followed_by_ws = np.zeros(marks.size, dtype=bool)
+    followed_by_ws[after] = is_ws[marks[after] + 1]
+    is_end = (flags & _END) > 0
+    closed = ((flags & _CLOSER) > 0) & ((prev & _END) > 0)
+    ornate = ((flags & _ORNATE) > 0) & ((prev & _DIGIT) > 0)
+    triggers = [marks[((is_end | closed) & followed_by_ws) | ornate | ((flags & _AYAH) > 0)]]
+
+    # What follows each newline, skipping spaces, tabs and CRs
+    newlines = np.flatnonzero(cps == _NEWLINE)
+    if newlines.size:
+        def significant(i):
+            c = cps[i]
+            return (c != 0x20) & (c != 0x09) & (c != 0x0D)
+        nxt = _scan(newlines + 1, n, significant, lambda: np.flatnonzero(significant(slice(None))))
+        found = nxt < n
+        following = np.zeros(newlines.size, dtype=cps.dtype)
+        following[found] = cps[nxt[found]]
+        triggers.append(nxt[following == _NEWLINE])
+        triggers.append(newlines[following == _HASH])
+
+    # Each boundary is the first word start after its trigger character
+    bounds = _scan(
+        np.concatenate(triggers) + 1, n,
+        lambda i: is_ws[i - 1] & ~is_ws[i],
+        lambda: _word_starts(is_ws, 0, n - 1),
+    )
+    bounds = np.sort(bounds[bounds < n])
+    return bounds[np.concatenate(([True], bounds[1:] != bounds[:-1]))] if bounds.size else bounds
+
+
+def _last_within(bounds: np.ndarray, bcum: np.ndarray, limit: int, start: int) -> int:
+    """Largest boundary whose cumulative tokens fit in limit, or start if none does."""
+    j = int(np.searchsorted(bcum, limit, side='right')) - 1
+    return int(bounds[j]) if j >= 0 and bounds[j] > start else start
+
+
+def _first_from(bounds: np.ndarray, bcum: np.ndarray, target: int, start: int, end: int) -> int:
+    """First boundary past start whose cumulative tokens reach target, or end."""
+    k = int(np.searchsorted(bcum, target, side='left'))
+    if k < bounds.size and start < bounds[k] < end:
+        return int(bounds[k])
+    return end
+
+
+def chunk_spans(text: str, chunk_tokens: int, overlap_tokens: int = 0) -> List[Tuple[int, int]]:
+    """Return (start, end) character spans of chunks of at most ~chunk_tokens.
+
+    Spans end on the last structural boundary that fits; a single sentence
+    longer than the budget is split between words. Consecutive spans overlap
+    by up to overlap_tokens of whole sentences (of words inside a split sentence).
+    """
+    n = len(text)
+    if not n or not text.strip():
+        return []
+    cps, kind = _classify(text)
+    cum = _token_cumsum(cps)
+    total = int(cum[-1])
+    budget = max(1, chunk_tokens) * UNITS
+    overlap = max(0, min(overlap_tokens, chunk_tokens // 2)) * UNITS
+    if total <= budget:
+        return [(0, n)]
+
+    is_ws = (kind & _WS).view(bool)  # _WS is bit 0
+    sentences = _boundaries(cps, kind, is_ws)
+    # int64 like the Python ints they are searched with, so searchsorted never casts them
+    scum = cum[sentences].astype(np.int64)
+
+    spans = []
+    start = 0
+    while start < n:
+        limit = int(cum[start]) + budget
+        if limit >= total:
+            spans.append((start, n))
+            break
+        end = _last_within(sentences, scum, limit, start)
+        split_sentence = end == start
+        if split_sentence:
+            # Word starts are only needed inside a sentence that does not fit
+            last = int(np.searchsorted(cum, cum.dtype.type(limit), side='right')) - 1
+            words = _word_starts(is_ws, start, last)
+            end = int(words[-1]) if words.size else start
+            if end == start:
+                # No whitespace either (very long token): cut at the budget
+                end = max(start + 1, last)
+        spans.append((start, end))
+        if not overlap:
+            start = end
+            continue
+        # Overlap, but not so much that the next chunk cannot reach the next sentence end
+        k = int(np.searchsorted(sentences, end, side='right'))
+        following = int(sentences[k]) if k < sentences.size else n
+        target = max(int(cum[end]) - overlap, int(cum[following]) - budget)
+        nxt = _first_from(sentences, scum, target, start, end)
+        if nxt == end and split_sentence and target > cum[start]:
+            words = _word_starts(is_ws, start, end - 1)
+            nxt = _first_from(words, cum[words].astype(np.int64), target, start, end)
+        start = nxt
+    return spans
+
+
+def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 200) -> List[str]:
+    """Split text into chunks of about chunk_size estimated tokens with chunk_overlap overlap."""
+    chunks = []
+    for start, end in chunk_spans(text, chunk_size, chunk_overlap):
+        chunk = text[start:end].strip()  # inner newlines are kept as structure
+        if chunk:
+            chunks.append(chunk)
+    return chunks
@@ -0,0 +1,104 @@
+"""
+Near-duplicate text detection with MinHash signatures and LSH banding.
+Used at ingest time so repeated hadith, translations and overlapping
+windows are embedded and indexed only once.
+"""
+import hashlib
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_MERSENNE = np.uint64((1 << 31) - 1)
+_ARABIC_DIACRITICS = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]')
+_TOKEN = re.compile(r'\w+')
+
+
+def strip_diacritics(text: str) -> str:
+    """text without Arabic diacritics (tashkeel)."""
+    return _ARABIC_DIACRITICS.sub('', text)
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Lowercased word tokens with Arabic diacritics (tashkeel) removed."""
+    return _TOKEN.findall(strip_diacritics(text.lower()))
+
+
+class MinHashDeduper:
+    """Remembers texts it has seen and flags new ones that are near-duplicates.
+
+    Signatures use `num_perm` hash permutations split into `bands` LSH bands;
+    candidates sharing a band are confirmed by their estimated Jaccard similarity
+    over word shingles before a text is called a duplicate.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 64, bands: int = 8, shingle_size: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_MERSENNE), size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, int(_MERSENNE), size=(num_perm, 1), dtype=np.uint64)
+        self._exact: Dict[bytes, str] = {}
+        self._signatures: List[np.ndarray] = []
+        self._owners: List[str] = []
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self.checked = 0
+        self.duplicates = 0
+
+    def _signature(self, tokens: List[str]) -> np.ndarray:
+        k = self.shingle_size
+        if len(tokens) <= k:
+            shingles = [' '.join(tokens)]
+        else:
+            shingles = [' '.join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+        x = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        x %= _MERSENNE
+        # (a*x + b) mod p for every permutation at once; a, x < 2^31 so no overflow
+        return ((self._a * x + self._b) % _MERSENNE).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, sig: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(i, sig[i * self.rows:(i + 1) * self.rows].tobytes()) for i in range(self.bands)]
+
+    def is_duplicate(self, text: str) -> bool:
+        """True if text nearly repeats an earlier one; otherwise remember it and return False."""
+        return self.find_duplicate(text) is not None
+
+    def find_duplicate(self, text: str, owner: str = '') -> Optional[str]:
+        """Owner of the earlier text that text nearly repeats, else None.
+
+        A new text is remembered under `owner` (e.g. its source file), so callers
+        can tell which kept text a skipped one depends on.
+        """
+        self.checked += 1
+        tokens = normalize_tokens(text)
+        exact = hashlib.sha1(' '.join(tokens).encode('utf-8')).digest()
+        if exact in self._exact:
+            self.duplicates += 1
+            return self._exact[exact]
+
+        sig = self._signature(tokens)
+        keys = self._band_keys(sig)
+        candidates = set()
+        for band, key in keys:
+            candidates.update(self._buckets[band].get(key, ()))
+        for idx in candidates:
+            if float(np.mean(self._signatures[idx] == sig)) >= self.threshold:
+                self.duplicates += 1
+                return self._owners[idx]
+
+        self._exact[exact] = owner
+        idx = len(self._signatures)
+        self._signatures.append(sig)
+        self._owners.append(owner)
+        for band, key in keys:
+            self._buckets[band].setdefault(key, []).append(idx)
+        return None
+
+    @property
+    def ratio(self) -> float:
+        return self.duplicates / self.checked if self.checked else 0.0
@@ -1,34 +1,133 @@
+import asyncio
+import hashlib
 import json
+import math
 import os
-from typing import List, Dict
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import List, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.core.config import settings
+from backend.core.logging import logger
+from backend.services.dedup import strip_diacritics
+from backend.services.scoring import normalize_rows, rank_chunks
 
 _BASE = os.path.dirname(os.path.dirname(__file__))
 _DUAS_PATH = os.path.join(_BASE, 'data', 'duas.json')
 
-_dua_cache: List[Dict] = []
+# How much a query word counts when found in each field
+FIELD_WEIGHTS = {'tags': 3.0, 'title': 2.0, 'transliteration': 1.0, 'translation': 0.5}
+_TOKEN = re.compile(r'\w+')
+# Minimum cosine similarity for a dua to answer a question semantically
+SEMANTIC_THRESHOLD = 0.45
+
+
+def _stem(tok: str) -> str:
+    # Just enough folding for topic words: exams -> exam, travelling/traveled -> travel
+    for suffix, min_len in (('ing', 6), ('ed', 5)):
+        if len(tok) >= min_len and tok.endswith(suffix):
+            tok = tok[:-len(suffix)]
+            if len(tok) > 3 and tok[-1] == tok[-2] and tok[-1] not in 'aeious':
+                tok = tok[:-1]
+            return tok
+    if len(tok) > 3 and tok.endswith('s') and not tok.endswith('ss'):
+        tok = tok[:-1]
+    return tok
+
+
+# Words that say "this is a dua question" but not which dua
+_STOPWORDS = {
+    'dua', 'duaa', 'supplication', 'prayer', 'pray', 'invocation', 'recite', 'say', 'read',
+    'a', 'an', 'the', 'for', 'of', 'to', 'in', 'on', 'and', 'or', 'with', 'me', 'my', 'i',
+    'is', 'are', 'what', 'which', 'give', 'tell', 'show', 'please', 'some', 'any', 'best',
+    'good', 'when', 'before', 'after', 'islamic', 'muslim', 'can', 'you', 'should',
+    'it', 'this', 'that', 'do', 'how', 'we', 'us', 'our', 'from', 'at', 'be', 'will', 'about',
+    'does', 'has', 'was', 'his', 'its', 'as', 'by', 'there',
+}
+# Compared with stemmed terms, so stemmed the same way ("this" -> "thi")
+STOPWORDS = {_stem(w) for w in _STOPWORDS}
+
+
+def normalize(text: str) -> List[str]:
+    """Index/query terms: lowercased, Latin and Arabic diacritics removed, suffixes folded."""
+    text = unicodedata.normalize('NFKD', strip_diacritics(text.lower()))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return [_stem(tok) for tok in _TOKEN.findall(text)]
+
+
+class DuaIndex:
+    """Inverted index from normalized terms to duas, weighted by field."""
+
+    def __init__(self, duas: List[Dict]):
+        self.duas = duas
+        self.postings: Dict[str, Dict[int, float]] = {}
+        for i, d in enumerate(duas):
+            fields = {
+                'tags': ' '.join(d.get('tags', [])),
+                'title': d.get('title', ''),
+                'transliteration': d.get('transliteration', ''),
+                'translation': d.get('translation', ''),
+            }
+            for field, text in fields.items():
+                for term in set(normalize(text)):
+                    if term in STOPWORDS:
+                        continue
+                    weights = self.postings.setdefault(term, {})
+                    weights[i] = max(weights.get(i, 0.0), FIELD_WEIGHTS[field])
+
+    def search(self, query: str, limit: int = 3) -> List[Dict]:
+        """Duas sharing terms with query, best first; [] if query names no topic."""
+        scores: Dict[int, float] = {}
+        n = len(self.duas)
+        for term in set(normalize(query)) - STOPWORDS:
+            weights = self.postings.get(term)
+            if not weights:
+                continue
+            idf = math.log(1 + n / len(weights))
+            for i, w in weights.items():
+                scores[i] = scores.get(i, 0.0) + w * idf
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+        return [self.duas[i] for i, _ in ranked]
+
+
+_index: Optional[DuaIndex] = None
+_index_key: Optional[Tuple[float, int]] = None
+_lock = threading.Lock()
+
+
+def _get_index() -> DuaIndex:
+    """Index of duas.json, rebuilt when the file changes on disk."""
+    global _index, _index_key
+    try:
+        st = os.stat(_DUAS_PATH)
+        key = (st.st_mtime, st.st_size)
+    except OSError:
+        key = None
+    with _lock:
+        if _index is None or key != _index_key:
+            duas = []
+            if key is not None:
+                try:
+                    with open(_DUAS_PATH, 'r', encoding='utf-8') as f:
+                        duas = json.load(f)
+                except ValueError:
+                    # Mid-edit or broken file: keep serving the last good index
+                    if _index is not None:
+                        return _index
+            _index, _index_key = DuaIndex(duas), key
+        return _index
 
 
 def load_duas() -> List[Dict]:
-    global _dua_cache
-    if _dua_cache:
-        return _dua_cache
-    if not os.path.exists(_DUAS_PATH):
-        _dua_cache = []
-        return _dua_cache
-    with open(_DUAS_PATH, 'r', encoding='utf-8') as f:
-        _dua_cache = json.load(f)
-    return _dua_cache
-
-
-def search_duas(query: str) -> List[Dict]:
-    q = query.lower()
-    results = []
-    for d in load_duas():
-        tags = ' '.join(d.get('tags', [])).lower()
-        title = d.get('title', '').lower()
-        if any(t in q for t in d.get('tags', [])) or any(w in tags for w in q.split()) or any(w in title for w in q.split()) or 'dua' in q or 'supplication' in q:
-            results.append(d)
-    return results
+    return _get_index().duas
+
+
+def search_duas(query: str, limit: int = 3) -> List[Dict]:
+    return _get_index().search(query, limit)
 
 
 def as_passages(duas: List[Dict]) -> List[Dict]:
@@ -54,3 +153,76 @@ def as_passages(duas: List[Dict]) -> List[Dict]:
             }
         })
     return passages
+
+
+# --- Semantic search: curated duas embedded once, cached in memory and on disk ---
+
+_semantic: Optional[Tuple[DuaIndex, str, List[Dict]]] = None  # (index, model, chunks with embeddings)
+_semantic_lock = asyncio.Lock()
+
+
+def _semantic_chunks(extra: List[Dict]) -> List[Tuple[Dict, str]]:
+    """(chunk, text to embed) for every dua in duas.json and `extra` (rag's built-in passages)."""
+    chunks = []
+    for d, p in zip(load_duas(), as_passages(load_duas())):
+        meta = {**p['meta'], 'source': p['source']}
+        described = f"{d.get('title', '')}. Topics: {', '.join(d.get('tags', []))}. {d.get('translation', '')}"
+        chunks.append(({'id': p['id'], 'text': p['text'], 'meta': meta}, described))
+    for p in extra:
+        meta = {'source': p.get('source', ''), 'reference': p.get('reference'), 'type': 'dua-curated'}
+        described = f"Topics: {', '.join(p.get('tags', []))}. {p['text']}"
+        chunks.append(({'id': p['id'], 'text': p['text'], 'meta': meta}, described))
+    return chunks
+
+
+async def _embedded_chunks(extra: List[Dict]) -> List[Dict]:
+    """Dua chunks with unit-normalized embeddings from the active embedding model."""
+    global _semantic
+    from backend.db.vectordb import get_active_embedding_model
+    from backend.services.embeddings import get_embedding_client
+
+    index, model = _get_index(), get_active_embedding_model()
+    if _semantic is not None and _semantic[0] is index and _semantic[1] == model:
+        return _semantic[2]
+    async with _semantic_lock:
+        if _semantic is not None and _semantic[0] is index and _semantic[1] == model:
+            return _semantic[2]
+        pairs = _semantic_chunks(extra)
+        texts = [text for _, text in pairs]
+        key = hashlib.sha256('\0'.join([model, *texts]).encode('utf-8')).hexdigest()
+        path = Path(settings.data_processed_dir) / 'dua_embeddings.npz'
+        vectors = None
+        try:
+            with np.load(path) as cached:
+                if str(cached['key']) == key:
+                    vectors = cached['vectors']
+        except (OSError, KeyError, ValueError):
+            pass
+        if vectors is None:
+            vectors = normalize_rows(await get_embedding_client(model).embed(texts)) if texts else np.zeros((0, 0))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp.npz')
+            np.savez(tmp, key=np.array(key), vectors=vectors)
+            os.replace(tmp, path)
+            logger.info(f"Embedded {len(texts)} curated duas with {model}")
+        chunks = [{**chunk, 'embedding': vec} for (chunk, _), vec in zip(pairs, vectors)]
+        _semantic = (index, model, chunks)
+        return chunks
+
+
+async def semantic_search_duas(
+    q_vec: Sequence[float],
+    extra: List[Dict],
+    top_k: int = 3,
+    threshold: float = SEMANTIC_THRESHOLD,
+) -> List[Dict]:
+    """Curated duas (duas.json and `extra`) most similar to the question vector, as passages."""
+    try:
+        chunks = await _embedded_chunks(extra)
+    except Exception as e:
+        logger.warning(f"Semantic dua search unavailable: {e}")
+        return []
+    passages = rank_chunks(q_vec, chunks, threshold, top_k)
+    for p in passages:
+        p['reference'] = p['meta'].get('reference')
+    return passages
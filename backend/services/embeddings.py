@@ -1,5 +1,5 @@
 import httpx
-from typing import List
+from typing import Dict, List
 from backend.core.config import settings
 
 class OllamaEmbeddingClient:
@@ -19,4 +19,12 @@ class OllamaEmbeddingClient:
                 embeddings.append(data['embedding'])
         return embeddings
 
-embedding_client = OllamaEmbeddingClient(settings.ollama_base_url, settings.embedding_model)
+_clients: Dict[str, OllamaEmbeddingClient] = {}
+
+def get_embedding_client(model: str) -> OllamaEmbeddingClient:
+    """Client for a specific model (the active index may use another than settings)."""
+    if model not in _clients:
+        _clients[model] = OllamaEmbeddingClient(settings.ollama_base_url, model)
+    return _clients[model]
+
+embedding_client = get_embedding_client(settings.embedding_model)
@@ -0,0 +1,136 @@
+"""
+HTML -> plain text extraction for web augmentation.
+Uses lxml with a single cleaning pass and main-content detection; falls back
+to BeautifulSoup's html.parser when lxml is not installed.
+"""
+import asyncio
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from backend.core.config import settings
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # optional dependency
+    lxml = None
+
+NOISE_TAGS = {'script', 'style', 'noscript', 'nav', 'header', 'footer', 'aside', 'iframe', 'form', 'button'}
+NOISE_PATTERNS = ('menu', 'navigation', 'sidebar', 'advertisement', 'ad-', 'cookie', 'popup', 'modal', 'social', 'share', 'comment')
+MAIN_XPATH = '//article | //main | //*[@role="main"]'
+
+_SHORT_OR_SYMBOLS = re.compile(r'^[\W\d]+$')
+_WS = re.compile(r'\s+')
+
+# Only libxml2's parse releases the GIL; the boilerplate walk and scoring are
+# Python. Worker processes keep all of it off the event loop (the page goes in
+# and the text comes back as plain strings, so shipping them is cheap).
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _is_noise(el) -> bool:
+    if el.tag in NOISE_TAGS:
+        return True
+    attrs = ((el.get('class') or '') + ' ' + (el.get('id') or '')).lower()
+    return bool(attrs.strip()) and any(pat in attrs for pat in NOISE_PATTERNS)
+
+
+def _finalize(text: str) -> str:
+    # Filter out very short lines (likely navigation) and collapse whitespace
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    filtered = [line for line in lines if len(line) > 20 and not _SHORT_OR_SYMBOLS.match(line)]
+    return _WS.sub(' ', ' '.join(filtered)).strip()
+
+
+def _main_content(body):
+    """Pick the element holding the article body, or None to keep the whole page."""
+    total = len(body.text_content())
+    if not total:
+        return None
+    candidates = body.xpath(MAIN_XPATH)
+    if not candidates:
+        # Text density heuristic: the container with the most paragraph text
+        scores = {}
+        for p in body.iter('p'):
+            parent = p.getparent()
+            if parent is not None:
+                scores[parent] = scores.get(parent, 0) + len(p.text_content())
+        candidates = [max(scores, key=scores.get)] if scores else []
+    best = max(candidates, key=lambda el: len(el.text_content()), default=None)
+    # Only narrow down when the candidate carries a real share of the page
+    if best is not None and len(best.text_content()) >= max(200, total // 4):
+        return best
+    return None
+
+
+def _extract_lxml(html: str) -> str:
+    try:
+        doc = lxml.html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        return ''
+    # Single walk: collect boilerplate and comments, then drop them (tail text is kept)
+    doomed = [el for el in doc.iter() if not isinstance(el.tag, str) or _is_noise(el)]
+    for el in doomed:
+        if el.getparent() is not None:
+            el.drop_tree()
+    body = doc.find('body')
+    root = body if body is not None else doc
+    main = _main_content(root)
+    if main is not None:
+        root = main
+    return _finalize(' '.join(root.itertext()))
+
+
+def _extract_bs4(html: str) -> str:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    # Remove common boilerplate elements
+    for tag in soup(list(NOISE_TAGS)):
+        tag.decompose()
+    # Remove elements with common noise classes/ids
+    for elem in soup.find_all(class_=True):
+        classes = elem.get('class') if hasattr(elem, 'get') else (elem.attrs.get('class', []) if hasattr(elem, 'attrs') else [])
+        if isinstance(classes, list) and any(pat in ' '.join(classes).lower() for pat in NOISE_PATTERNS):
+            elem.decompose()
+    for elem in soup.find_all(id=True):
+        elem_id = elem.get('id') if hasattr(elem, 'get') else (elem.attrs.get('id', '') if hasattr(elem, 'attrs') else '')
+        if elem_id and any(pat in elem_id.lower() for pat in NOISE_PATTERNS):
+            elem.decompose()
+    return _finalize(soup.get_text(separator=' '))
+
+
+def extract_text(html: str) -> str:
+    """Return the cleaned main text of an HTML page."""
+    if not html:
+        return ''
+    if lxml is not None:
+        return _extract_lxml(html)
+    return _extract_bs4(html)
+
+
+async def extract_text_async(html: str) -> str:
+    """extract_text in the extraction worker processes, off the event loop."""
+    global _executor
+    if not html:
+        return ''
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.html_extract_workers, mp_context=multiprocessing.get_context('spawn')
+        )
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_executor, extract_text, html)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory): start a fresh pool next time
+        _executor = None
+        return await asyncio.to_thread(extract_text, html)
+
+
+def shutdown_extract_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,131 @@
+"""
+Background ingest jobs.
+POST /ingest (and POST /reembed) enqueue a job; a small thread pool runs
+scripts.ingest / scripts.reembed off the request loop (each run owns its own
+event loop) and exposes progress, errors and cancellation.
+"""
+import threading
+import time
+import uuid
+from argparse import Namespace
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from backend.core.config import settings
+from backend.core.logging import logger
+
+_FINISHED = ('completed', 'failed', 'cancelled')
+_KEEP_FINISHED = 50  # finished jobs kept for status queries
+
+
+class IngestJob:
+    def __init__(self, job_id: str, args: Namespace, kind: str = 'ingest'):
+        self.id = job_id
+        self.args = args
+        self.kind = kind  # 'ingest' or 'reembed'
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.summary: Optional[Dict] = None
+        self.cancel_event = threading.Event()
+        self.pipeline = None
+
+    def snapshot(self) -> Dict:
+        progress = self.pipeline.progress() if self.pipeline is not None else {}
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'source': getattr(self.args, 'source', None),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+            'summary': self.summary,
+            'progress': progress,
+        }
+
+
+class IngestJobManager:
+    def __init__(self, max_concurrent: int, max_queued: int):
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='ingest-job')
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, args: Namespace, kind: str = 'ingest') -> Optional[IngestJob]:
+        """Queue an ingest (or re-embed) run; returns None when the queue is full."""
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j.status == 'queued')
+            if queued >= self.max_queued:
+                return None
+            job = IngestJob(uuid.uuid4().hex, args, kind)
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestJob]:
+        return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        with self._lock:
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+        return job
+
+    def shutdown(self):
+        for job in list(self._jobs.values()):
+            job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prune(self):
+        finished = [j.id for j in self._jobs.values() if j.status in _FINISHED]
+        for job_id in finished[:max(0, len(finished) - _KEEP_FINISHED)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: IngestJob):
+        # Imported lazily: scripts.ingest pulls in the parsers and the pipeline
+        from scripts.ingest import run_ingest, IngestCancelled
+        from scripts.reembed import run_reembed
+        runner = run_reembed if job.kind == 'reembed' else run_ingest
+
+        with self._lock:
+            if job.status != 'queued':
+                return  # cancelled while waiting
+            job.status = 'running'
+            job.started_at = time.time()
+
+        def attach(pipeline):
+            job.pipeline = pipeline
+
+        try:
+            job.summary = runner(
+                job.args,
+                cancel_event=job.cancel_event,
+                on_pipeline=attach,
+                log=lambda msg: logger.info(f"[{job.kind} {job.id[:8]}] {msg}"),
+            )
+            job.status = 'completed'
+        except IngestCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            logger.error(f"{job.kind.capitalize()} job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+
+
+ingest_jobs = IngestJobManager(settings.ingest_max_concurrent_jobs, settings.ingest_max_queued_jobs)
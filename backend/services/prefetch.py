@@ -0,0 +1,68 @@
+"""
+Background prefetch of the curated source URLs used by rag.py.
+Warms the web cache on startup and revalidates it periodically so topic
+requests (dua, hijri date, halal food, general keywords) hit local data.
+"""
+import asyncio
+from typing import List, Optional
+
+from backend.core.config import settings
+from backend.core.logging import logger
+from backend.services.web_fetch import warm_url_cache
+from backend.services.rag import (
+    GENERAL_KEYWORD_URLS,
+    get_auto_dua_urls,
+    get_hijri_date_urls,
+    get_halal_food_urls,
+)
+
+# Keywords that switch on the optional branches of the URL helpers
+_DUA_PROBES = ["", "success", "forgiveness", "travel"]
+_HALAL_FOOD_PROBES = ["", "gelatin", "alcohol", "meat"]
+
+_task: Optional[asyncio.Task] = None
+
+
+def curated_source_urls() -> List[str]:
+    urls: List[str] = []
+    for key_urls in GENERAL_KEYWORD_URLS.values():
+        urls.extend(key_urls)
+    for probe in _DUA_PROBES:
+        urls.extend(get_auto_dua_urls(probe))
+    urls.extend(get_hijri_date_urls())
+    for probe in _HALAL_FOOD_PROBES:
+        urls.extend(get_halal_food_urls(probe))
+    return list(dict.fromkeys(urls))
+
+
+async def _prefetch_loop():
+    revalidate = False  # entries left fresh by a previous run are fine on startup
+    while True:
+        urls = curated_source_urls()
+        try:
+            warmed = await warm_url_cache(urls, revalidate=revalidate, concurrency=settings.prefetch_concurrency)
+            logger.info(f"Prefetched {warmed}/{len(urls)} curated source URLs")
+        except Exception as e:
+            logger.warning(f"Prefetch cycle failed: {e}")
+        revalidate = True
+        await asyncio.sleep(settings.prefetch_interval_seconds)
+
+
+def start_prefetch():
+    """Start the prefetch loop on the running event loop (no-op if disabled)."""
+    global _task
+    if not settings.prefetch_enabled or _task is not None:
+        return
+    _task = asyncio.create_task(_prefetch_loop())
+
+
+async def stop_prefetch():
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
@@ -10,10 +10,11 @@ from backend.services.generator import (
 from backend.services.router import classify_intent
 from backend.core.config import settings
 import httpx
-import numpy as np
 from backend.services.web_fetch import fetch_and_prepare_web_chunks
+from backend.services.web_store import search_web_store, persist_web_chunks
+from backend.services.scoring import rank_chunks
 import urllib.parse
-from backend.services.duas import search_duas, as_passages
+from backend.services.duas import search_duas, as_passages, semantic_search_duas
 import re
 
 async def ask(
@@ -84,36 +85,38 @@ async def ask(
         if not effective_urls:
             effective_urls = get_auto_general_urls(question)
         try:
-            if effective_urls:
+            scored = []
+            q_vec = None
+            if settings.web_store_enabled or effective_urls:
                 q_vec = (await fetch_query_embedding(question))
+            # Promoted web chunks can answer locally; explicit URLs are always fetched,
+            # auto URLs only when no stored chunk is a close match
+            if q_vec is not None:
+                scored = await search_web_store(q_vec, top_k, 0.20)
+            local_hit = any(p['score'] >= settings.web_store_local_hit_score for p in scored)
+            if effective_urls and (web_urls or not local_hit):
                 web_chunks = await fetch_and_prepare_web_chunks(effective_urls, question)
-                scored = []
-                for wc in web_chunks:
-                    vec = wc.get('embedding')
-                    if not vec:
-                        continue
-                    sim = cosine_similarity(q_vec, vec)
-                    if sim > 0.20:  # Slightly lower threshold for internet-only mode
-                        scored.append({
-                            'id': wc['id'],
-                            'text': wc['text'],
-                            'source': wc['meta'].get('source',''),
-                            'score': float(sim),
-                            'meta': wc['meta'],
-                        })
-                if scored:
-                    answer = await generate_answer(question, scored, max_tokens, temperature)
-                    citations = [{
-                        'source': p.get('source',''),
-                        'reference': p['meta'].get('chunk_index'),
-                        'snippet': p['text'][:180] + ('...' if len(p['text']) > 180 else '')
-                    } for p in scored]
-                    return {
-                        'answer': answer,
-                        'citations': citations,
-                        'used_passage_ids': [p['id'] for p in scored],
-                        'mode': 'web'
-                    }
+                # Slightly lower threshold for internet-only mode
+                web_scored = rank_chunks(q_vec, web_chunks, 0.20, top_k)
+                used_ids = {p['id'] for p in web_scored}
+                await persist_web_chunks([wc for wc in web_chunks if wc['id'] in used_ids])
+                # Merge with the stored hits; the same text may come from both
+                seen = {p['text'] for p in web_scored}
+                merged = web_scored + [p for p in scored if p['text'] not in seen]
+                scored = sorted(merged, key=lambda p: p['score'], reverse=True)[:top_k]
+            if scored:
+                answer = await generate_answer(question, scored, max_tokens, temperature)
+                citations = [{
+                    'source': p.get('source',''),
+                    'reference': p['meta'].get('chunk_index'),
+                    'snippet': p['text'][:180] + ('...' if len(p['text']) > 180 else '')
+                } for p in scored]
+                return {
+                    'answer': answer,
+                    'citations': citations,
+                    'used_passage_ids': [p['id'] for p in scored],
+                    'mode': 'web'
+                }
         except Exception:
             pass
         # If web failed or no chunks matched, supply curated answer for recognized topics
@@ -144,27 +147,23 @@ async def ask(
         }
 
     # Default: do retrieval (RAG) possibly with web augmentation if requested or rag+internet
-    passages = await retrieve(question, top_k)
+    # One query embedding serves retrieval, web scoring and the fallback branches
+    q_vec = await fetch_query_embedding(question)
+    passages = await retrieve(question, top_k, query_vec=q_vec)
 
     # Optionally augment with web chunks (ephemeral, not stored in vector DB)
     if use_web or sm == "rag+internet" or (web_urls and len(web_urls) > 0):
         try:
-            q_vec = (await fetch_query_embedding(question))
-            web_chunks = await fetch_and_prepare_web_chunks(web_urls or [], question)
-            # score each web chunk via cosine similarity
-            for wc in web_chunks:
-                vec = wc.get('embedding')
-                if vec:
-                    sim = cosine_similarity(q_vec, vec)
-                else:
-                    sim = 0.0
-                passages.append({
-                    'id': wc['id'],
-                    'text': wc['text'],
-                    'source': wc['meta'].get('source',''),
-                    'score': float(sim),
-                    'meta': wc['meta'],
-                })
+            stored = await search_web_store(q_vec, top_k, 0.3)
+            passages.extend(stored)
+            # Explicit URLs are always honoured; otherwise stored chunks stand in for the network
+            web_chunks = []
+            if web_urls or not stored:
+                web_chunks = await fetch_and_prepare_web_chunks(web_urls or [], question)
+            web_scored = rank_chunks(q_vec, web_chunks, 0.3, top_k)
+            passages.extend(web_scored)
+            used_ids = {p['id'] for p in web_scored}
+            await persist_web_chunks([wc for wc in web_chunks if wc['id'] in used_ids])
         except Exception:
             pass  # Fail silently; still proceed with existing passages
     
@@ -217,7 +216,10 @@ async def ask(
             # 1) Try curated dataset from backend/data/duas.json
             file_duas = search_duas(question)
             curated = as_passages(file_duas) if file_duas else []
-            # 2) Fallback to built-in small curated set
+            # 2) No keyword match: compare the question vector with all curated duas
+            if not curated:
+                curated = await semantic_search_duas(q_vec, CURATED_DUAS)
+            # 3) Fallback to built-in small curated set
             if not curated:
                 curated = get_curated_dua_passages(question)
             if curated:
@@ -226,7 +228,7 @@ async def ask(
                 citations = []
                 for p in curated:
                     src = p.get('source','')
-                    ref = p.get('reference')
+                    ref = p.get('reference') or p.get('meta', {}).get('reference')
                     snippet = p['text'][:180] + ('...' if len(p['text']) > 180 else '')
                     url = map_citation_url(src, ref, snippet)
                     citations.append({
@@ -242,130 +244,31 @@ async def ask(
                     'mode': 'rag'
                 }
             # If curated not matched, attempt web (best-effort)
-            auto_urls = get_auto_dua_urls(question)
-            if auto_urls:
-                try:
-                    q_vec = (await fetch_query_embedding(question))
-                    web_chunks = await fetch_and_prepare_web_chunks(auto_urls, question)
-                    scored = []
-                    for wc in web_chunks:
-                        vec = wc.get('embedding')
-                        if not vec:
-                            continue
-                        sim = cosine_similarity(q_vec, vec)
-                        if sim > 0.25:
-                            scored.append({
-                                'id': wc['id'],
-                                'text': wc['text'],
-                                'source': wc['meta'].get('source',''),
-                                'score': float(sim),
-                                'meta': wc['meta'],
-                            })
-                    if scored:
-                        answer = await generate_answer(question, scored, max_tokens, temperature)
-                        citations = []
-                        for p in scored:
-                            src = p.get('source','')
-                            url = src if isinstance(src, str) and src.startswith('http') else None
-                            citations.append({
-                                'source': src,
-                                'reference': p['meta'].get('chunk_index'),
-                                'snippet': p['text'][:180] + ('...' if len(p['text']) > 180 else ''),
-                                **({'url': url} if url else {})
-                            })
-                        return {
-                            'answer': answer + "\n\n(Used ephemeral web sources for dua retrieval.)",
-                            'citations': citations,
-                            'used_passage_ids': [p['id'] for p in scored],
-                            'mode': 'rag-web'
-                        }
-                except Exception:
-                    pass
-        
+            web_answer = await answer_from_web(
+                question, q_vec, get_auto_dua_urls(question), top_k, max_tokens, temperature,
+                note="(Used ephemeral web sources for dua retrieval.)"
+            )
+            if web_answer:
+                return web_answer
+
         # Hijri date query
         if is_hijri_date_query(question):
-            auto_urls = get_hijri_date_urls()
-            if auto_urls:
-                try:
-                    q_vec = (await fetch_query_embedding(question))
-                    web_chunks = await fetch_and_prepare_web_chunks(auto_urls, question)
-                    scored = []
-                    for wc in web_chunks:
-                        vec = wc.get('embedding')
-                        if not vec:
-                            continue
-                        sim = cosine_similarity(q_vec, vec)
-                        if sim > 0.25:
-                            scored.append({
-                                'id': wc['id'],
-                                'text': wc['text'],
-                                'source': wc['meta'].get('source',''),
-                                'score': float(sim),
-                                'meta': wc['meta'],
-                            })
-                    if scored:
-                        answer = await generate_answer(question, scored, max_tokens, temperature)
-                        citations = []
-                        for p in scored:
-                            src = p.get('source','')
-                            url = src if isinstance(src, str) and src.startswith('http') else None
-                            citations.append({
-                                'source': src,
-                                'reference': p['meta'].get('chunk_index'),
-                                'snippet': p['text'][:180] + ('...' if len(p['text']) > 180 else ''),
-                                **({'url': url} if url else {})
-                            })
-                        return {
-                            'answer': answer + "\n\n(Used web sources for hijri date info.)",
-                            'citations': citations,
-                            'used_passage_ids': [p['id'] for p in scored],
-                            'mode': 'rag-web'
-                        }
-                except Exception:
-                    pass
-        
+            web_answer = await answer_from_web(
+                question, q_vec, get_hijri_date_urls(), top_k, max_tokens, temperature,
+                note="(Used web sources for hijri date info.)"
+            )
+            if web_answer:
+                return web_answer
+
         # Halal food query
         if is_halal_food_query(question):
-            auto_urls = get_halal_food_urls(question)
-            if auto_urls:
-                try:
-                    q_vec = (await fetch_query_embedding(question))
-                    web_chunks = await fetch_and_prepare_web_chunks(auto_urls, question)
-                    scored = []
-                    for wc in web_chunks:
-                        vec = wc.get('embedding')
-                        if not vec:
-                            continue
-                        sim = cosine_similarity(q_vec, vec)
-                        if sim > 0.25:
-                            scored.append({
-                                'id': wc['id'],
-                                'text': wc['text'],
-                                'source': wc['meta'].get('source',''),
-                                'score': float(sim),
-                                'meta': wc['meta'],
-                            })
-                    if scored:
-                        answer = await generate_answer(question, scored, max_tokens, temperature)
-                        citations = []
-                        for p in scored:
-                            src = p.get('source','')
-                            url = src if isinstance(src, str) and src.startswith('http') else None
-                            citations.append({
-                                'source': src,
-                                'reference': p['meta'].get('chunk_index'),
-                                'snippet': p['text'][:180] + ('...' if len(p['text']) > 180 else ''),
-                                **({'url': url} if url else {})
-                            })
-                        return {
-                            'answer': answer + "\n\n(Used web sources for halal food info.)",
-                            'citations': citations,
-                            'used_passage_ids': [p['id'] for p in scored],
-                            'mode': 'rag-web'
-                        }
-                except Exception:
-                    pass
-        
+            web_answer = await answer_from_web(
+                question, q_vec, get_halal_food_urls(question), top_k, max_tokens, temperature,
+                note="(Used web sources for halal food info.)"
+            )
+            if web_answer:
+                return web_answer
+
         # Current time/date query (direct response with actual datetime)
         if is_current_datetime_query(question):
             from datetime import datetime
@@ -428,15 +331,49 @@ async def generate_fallback_answer(question: str, max_tokens: int, temperature:
         return data.get('response', '')
 
 async def fetch_query_embedding(question: str) -> List[float]:
-    from backend.services.embeddings import embedding_client
-    vec = (await embedding_client.embed([question]))[0]
+    # Same model as the active index, so one vector serves retrieval and web scoring
+    from backend.services.embeddings import get_embedding_client
+    from backend.db.vectordb import get_active_embedding_model
+    vec = (await get_embedding_client(get_active_embedding_model()).embed([question]))[0]
     return vec
 
-def cosine_similarity(a: List[float], b: List[float]) -> float:
-    va = np.array(a)
-    vb = np.array(b)
-    denom = (np.linalg.norm(va) * np.linalg.norm(vb)) or 1e-9
-    return float(np.dot(va, vb) / denom)
+async def answer_from_web(
+    question: str,
+    q_vec: List[float],
+    urls: List[str],
+    top_k: int,
+    max_tokens: int,
+    temperature: float,
+    note: str,
+    threshold: float = 0.25,
+) -> Optional[Dict]:
+    """Answer from topic web sources (mode rag-web), or None if nothing relevant was found."""
+    if not urls:
+        return None
+    try:
+        web_chunks = await fetch_and_prepare_web_chunks(urls, question)
+        scored = rank_chunks(q_vec, web_chunks, threshold, top_k)
+        if not scored:
+            return None
+        answer = await generate_answer(question, scored, max_tokens, temperature)
+    except Exception:
+        return None
+    citations = []
+    for p in scored:
+        src = p.get('source','')
+        url = src if isinstance(src, str) and src.startswith('http') else None
+        citations.append({
+            'source': src,
+            'reference': p['meta'].get('chunk_index'),
+            'snippet': p['text'][:180] + ('...' if len(p['text']) > 180 else ''),
+            **({'url': url} if url else {})
+        })
+    return {
+        'answer': answer + "\n\n" + note,
+        'citations': citations,
+        'used_passage_ids': [p['id'] for p in scored],
+        'mode': 'rag-web'
+    }
 
 def _shorten(text: str, words: int = 6) -> str:
     parts = (text or '').split()
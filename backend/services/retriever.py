@@ -1,9 +1,9 @@
-from typing import List, Dict
-from backend.db.vectordb import query_texts
-from backend.services.embeddings import embedding_client
+from typing import List, Dict, Optional
+from backend.db.vectordb import query_texts, get_active_embedding_model
+from backend.services.embeddings import get_embedding_client
 
-async def retrieve(query: str, top_k: int) -> List[Dict]:
-    vec = (await embedding_client.embed([query]))[0]
+async def retrieve(query: str, top_k: int, query_vec: Optional[List[float]] = None) -> List[Dict]:
+    vec = query_vec if query_vec is not None else (await get_embedding_client(get_active_embedding_model()).embed([query]))[0]
     results = query_texts(vec, top_k)
     # map to a cleaner structure
     passages = []
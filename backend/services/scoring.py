@@ -0,0 +1,55 @@
+"""
+Shared similarity scoring for candidate chunks.
+Candidate embeddings are unit-normalized once when they are produced, so
+scoring a whole batch is one matrix-vector product.
+"""
+from typing import List, Dict, Optional, Sequence
+
+import numpy as np
+
+
+def normalize_rows(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """Return vectors as a float32 matrix with unit-length rows."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1e-9
+    return matrix / norms
+
+
+def rank_chunks(
+    q_vec: Sequence[float],
+    chunks: List[Dict],
+    threshold: float,
+    top_k: Optional[int] = None,
+) -> List[Dict]:
+    """Score chunks (with pre-normalized 'embedding') against q_vec.
+
+    Keeps those scoring above threshold, at most top_k of them, and returns
+    passages ({id, text, source, score, meta}) best first.
+    """
+    q = normalize_rows(q_vec)[0]
+    # Embeddings cached under a previous model may have another dimension
+    candidates = [c for c in chunks if c.get('embedding') is not None and len(c['embedding']) == q.size]
+    if not candidates:
+        return []
+    matrix = np.vstack([c['embedding'] for c in candidates]).astype(np.float32, copy=False)
+    sims = matrix @ q
+
+    idx = np.flatnonzero(sims > threshold)
+    if top_k is not None and 0 < top_k < idx.size:
+        idx = idx[np.argpartition(-sims[idx], top_k - 1)[:top_k]]
+    idx = idx[np.argsort(-sims[idx], kind='stable')]
+
+    passages = []
+    for i in idx:
+        c = candidates[i]
+        passages.append({
+            'id': c['id'],
+            'text': c['text'],
+            'source': c['meta'].get('source', ''),
+            'score': float(sims[i]),
+            'meta': c['meta'],
+        })
+    return passages
@@ -1,129 +1,165 @@
+import asyncio
 import httpx
-from bs4 import BeautifulSoup
-from typing import List, Dict
-from backend.services.embeddings import embedding_client
-import re
+from typing import List, Dict, Optional
+from backend.core.config import settings
+from backend.core.logging import logger
+from backend.db.webcache import WebCache
+from backend.services.chunking import chunk_text
+from backend.db.vectordb import get_active_embedding_model
+from backend.services.embeddings import get_embedding_client
+from backend.services.html_extract import extract_text, extract_text_async
+from backend.services.scoring import normalize_rows
 import hashlib
 import time
 
 USER_AGENT = "IslamicRAGBot/0.1 (Educational Retrieval)"
 
-# Simple LRU cache: {url_hash: {'chunks': [...], 'timestamp': ...}}
-_WEB_CACHE = {}
-_CACHE_SIZE = 50
-_CACHE_TTL = 3600  # 1 hour
+# On-disk LRU cache of cleaned pages + chunk embeddings, shared by all workers.
+# Opened on first use so importing this module creates no files.
+_web_cache_instance: Optional[WebCache] = None
+
+
+def _web_cache() -> WebCache:
+    global _web_cache_instance
+    if _web_cache_instance is None:
+        _web_cache_instance = WebCache(settings.web_cache_path, settings.web_cache_max_bytes)
+    return _web_cache_instance
 
 def clean_html(html: str) -> str:
-    soup = BeautifulSoup(html, 'html.parser')
-    # Remove common boilerplate elements
-    for tag in soup(['script', 'style', 'noscript', 'nav', 'header', 'footer', 'aside', 'iframe', 'form', 'button']):
-        tag.decompose()
-    # Remove elements with common noise classes/ids
-    noise_patterns = ['menu', 'navigation', 'sidebar', 'advertisement', 'ad-', 'cookie', 'popup', 'modal', 'social', 'share', 'comment']
-    for elem in soup.find_all(class_=True):
-        classes = elem.get('class') if hasattr(elem, 'get') else (elem.attrs.get('class', []) if hasattr(elem, 'attrs') else [])
-        if isinstance(classes, list) and any(pat in ' '.join(classes).lower() for pat in noise_patterns):
-            elem.decompose()
-    for elem in soup.find_all(id=True):
-        elem_id = elem.get('id') if hasattr(elem, 'get') else (elem.attrs.get('id', '') if hasattr(elem, 'attrs') else '')
-        if elem_id and any(pat in elem_id.lower() for pat in noise_patterns):
-            elem.decompose()
-    text = soup.get_text(separator=' ')
-    # Collapse whitespace and filter out very short lines (likely navigation)
-    lines = [line.strip() for line in text.split('\n') if line.strip()]
-    filtered = [line for line in lines if len(line) > 20 and not re.match(r'^[\W\d]+$', line)]
-    text = ' '.join(filtered)
-    # Collapse multiple spaces
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+    return extract_text(html)
 
-async def fetch_url(url: str, timeout: int = 15) -> str:
+async def _fetch_page(
+    client: httpx.AsyncClient,
+    url: str,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> Optional[Dict]:
+    """GET a page, conditionally if validators are known.
+
+    Returns {'not_modified': True} on 304, the cleaned text plus new validators
+    on 200, or None when the request fails.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
     try:
-        async with httpx.AsyncClient(timeout=timeout, headers={"User-Agent": USER_AGENT}) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            return clean_html(resp.text)
+        resp = await client.get(url, headers=headers)
+        if resp.status_code == 304:
+            return {'not_modified': True}
+        resp.raise_for_status()
+        return {
+            'not_modified': False,
+            'text': await extract_text_async(resp.text),
+            'etag': resp.headers.get('etag'),
+            'last_modified': resp.headers.get('last-modified'),
+        }
     except Exception:
-        return ''
-
-def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 200) -> List[str]:
-    words = text.split()
-    chunks = []
-    start = 0
-    while start < len(words):
-        end = min(len(words), start + chunk_size)
-        chunks.append(' '.join(words[start:end]))
-        if end == len(words):
-            break
-        start = end - chunk_overlap
-        if start < 0:
-            start = 0
+        return None
+
+async def fetch_url(url: str, timeout: int = 15) -> str:
+    async with httpx.AsyncClient(timeout=timeout, headers={"User-Agent": USER_AGENT}) as client:
+        page = await _fetch_page(client, url)
+    return (page or {}).get('text', '')
+
+def _stamped(chunks: List[Dict], fetched_at: float) -> List[Dict]:
+    for c in chunks:
+        c['fetched_at'] = fetched_at
     return chunks
 
+async def _load_url_chunks(client: httpx.AsyncClient, url: str, revalidate: bool = False) -> List[Dict]:
+    """Return [{'text', 'chunk_index', 'embedding', 'fetched_at'}] for url, using the persistent cache.
+
+    Fresh entries are served as-is unless revalidate is set. Stale entries are
+    revalidated with ETag/Last-Modified; a 304 reuses the stored chunks and embeddings.
+    fetched_at is when the content was last downloaded or revalidated.
+    """
+    cached = _web_cache().get(url)
+    fresh = cached and time.time() - cached['fetched_at'] < settings.web_cache_ttl_seconds
+    if fresh and not revalidate:
+        return _stamped(cached['chunks'], cached['fetched_at'])
+
+    page = await _fetch_page(
+        client,
+        url,
+        etag=cached['etag'] if cached else None,
+        last_modified=cached['last_modified'] if cached else None,
+    )
+    if page is None:
+        # Network failure: a stale copy beats nothing
+        return _stamped(cached['chunks'], cached['fetched_at']) if cached else []
+    if page['not_modified'] and cached:
+        _web_cache().mark_validated(url)
+        return _stamped(cached['chunks'], time.time())
+
+    page_text = page.get('text', '')
+    if not page_text:
+        return []
+    url_chunks = []
+    seen_hashes = set()
+    for idx, ch in enumerate(chunk_text(page_text)):
+        # Limit very short chunks
+        if len(ch) < 40:
+            continue
+        chunk_hash = hashlib.md5(ch.lower().encode()).hexdigest()
+        if chunk_hash in seen_hashes:
+            continue
+        seen_hashes.add(chunk_hash)
+        url_chunks.append({'text': ch, 'chunk_index': idx})
+
+    _stamped(url_chunks, time.time())
+    if url_chunks:
+        # Normalize once here so scoring is a single matmul per request
+        embedder = get_embedding_client(get_active_embedding_model())
+        url_embeddings = normalize_rows(await embedder.embed([c['text'] for c in url_chunks]))
+        for c, emb in zip(url_chunks, url_embeddings):
+            c['embedding'] = emb
+        try:
+            _web_cache().put(url, page_text, url_chunks, etag=page.get('etag'), last_modified=page.get('last_modified'))
+        except Exception as e:
+            logger.warning(f"Web cache write failed for {url}: {e}")
+    return url_chunks
+
+async def warm_url_cache(urls: List[str], revalidate: bool = False, concurrency: int = 4) -> int:
+    """Fetch, clean, chunk and embed urls into the cache ahead of user requests.
+
+    Returns how many URLs ended up with cached chunks.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=15, headers={"User-Agent": USER_AGENT}) as client:
+        async def warm(u: str) -> bool:
+            async with semaphore:
+                try:
+                    return bool(await _load_url_chunks(client, u, revalidate=revalidate))
+                except Exception as e:
+                    logger.warning(f"Prefetch failed for {u}: {e}")
+                    return False
+        results = await asyncio.gather(*(warm(u) for u in urls))
+    return sum(results)
+
 async def fetch_and_prepare_web_chunks(urls: List[str], question: str) -> List[Dict]:
     # Fetch and embed chunks; return structured list with embeddings for scoring
-    # Use cache to reduce repeat fetches
     docs = []
-    doc_index = 0
-    all_texts = []
-    chunk_meta = []
-    now = time.time()
-    seen_hashes = set()  # Deduplicate similar chunks
-    
-    for u in urls:
-        url_hash = hashlib.md5(u.encode()).hexdigest()
-        # Check cache
-        if url_hash in _WEB_CACHE:
-            cached = _WEB_CACHE[url_hash]
-            if now - cached['timestamp'] < _CACHE_TTL:
-                # Reuse cached chunks (already deduplicated)
-                for cached_doc in cached['chunks']:
-                    docs.append(cached_doc)
-                    doc_index += 1
-                continue
-            else:
-                # Expired, remove
-                del _WEB_CACHE[url_hash]
-        
-        page_text = await fetch_url(u)
-        if not page_text:
-            continue
-        chunks = chunk_text(page_text)
-        url_docs = []
-        for idx, ch in enumerate(chunks):
-            # Limit very short chunks
-            if len(ch) < 40:
-                continue
-            # Deduplicate: hash normalized chunk
-            chunk_hash = hashlib.md5(ch.lower().encode()).hexdigest()
-            if chunk_hash in seen_hashes:
-                continue
-            seen_hashes.add(chunk_hash)
-            
-            meta = {
-                'source': u,
-                'chunk_index': idx,
-                'ephemeral': True,
-                'type': 'web'
-            }
-            chunk_docs = {'id': f'web-{doc_index}', 'text': ch, 'meta': meta}
-            docs.append(chunk_docs)
-            url_docs.append(chunk_docs)
-            all_texts.append(ch)
-            chunk_meta.append(meta)
-            doc_index += 1
-        
-        # Embed only new texts from this URL
-        if url_docs:
-            url_texts = [d['text'] for d in url_docs]
-            url_embeddings = await embedding_client.embed(url_texts)
-            for i, emb in enumerate(url_embeddings):
-                url_docs[i]['embedding'] = emb
-            # Store in cache
-            _WEB_CACHE[url_hash] = {'chunks': url_docs, 'timestamp': now}
-            # Enforce cache size
-            if len(_WEB_CACHE) > _CACHE_SIZE:
-                oldest = min(_WEB_CACHE.items(), key=lambda x: x[1]['timestamp'])
-                del _WEB_CACHE[oldest[0]]
-    
+    seen_hashes = set()  # Deduplicate similar chunks across URLs
+    async with httpx.AsyncClient(timeout=15, headers={"User-Agent": USER_AGENT}) as client:
+        for u in urls:
+            for c in await _load_url_chunks(client, u):
+                chunk_hash = hashlib.md5(c['text'].lower().encode()).hexdigest()
+                if chunk_hash in seen_hashes:
+                    continue
+                seen_hashes.add(chunk_hash)
+                meta = {
+                    'source': u,
+                    'chunk_index': c['chunk_index'],
+                    'ephemeral': True,
+                    'type': 'web',
+                    'fetched_at': c['fetched_at'],
+                }
+                docs.append({
+                    'id': f'web-{len(docs)}',
+                    'text': c['text'],
+                    'meta': meta,
+                    'embedding': c.get('embedding'),
+                })
     return docs
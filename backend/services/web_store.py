@@ -0,0 +1,90 @@
+"""
+Opt-in persistence of vetted web chunks into the "web_chunks" vector collection.
+Chunks that were relevant enough to answer a question are stored with their
+source URL, fetch time, content hash and expiry, so later internet-mode
+questions can be answered locally before going to the network.
+"""
+import asyncio
+import hashlib
+import time
+from typing import List, Dict
+
+from backend.core.config import settings
+from backend.core.logging import logger
+from backend.db.vectordb import upsert_web_texts, query_web_texts, delete_expired_web_texts
+
+_PURGE_INTERVAL = 3600  # seconds between expired-chunk sweeps
+_last_purge = 0.0
+
+
+def content_hash(text: str) -> str:
+    normalized = ' '.join(text.lower().split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def _persist(chunks: List[Dict]):
+    global _last_purge
+    now = time.time()
+    ids, texts, metas, embs = [], [], [], []
+    seen = set()
+    for c in chunks:
+        # Age from when the page was downloaded or revalidated, not from now
+        fetched_at = c['meta'].get('fetched_at', now)
+        expires_at = fetched_at + settings.web_store_ttl_seconds
+        h = content_hash(c['text'])
+        if h in seen or expires_at <= now:
+            continue
+        seen.add(h)
+        ids.append(f'webstore-{h}')  # same text from any URL dedups to one entry
+        texts.append(c['text'])
+        metas.append({
+            'source': c['meta'].get('source', ''),
+            'chunk_index': c['meta'].get('chunk_index', 0),
+            'type': 'web',
+            'content_hash': h,
+            'fetched_at': fetched_at,
+            'expires_at': expires_at,
+        })
+        embs.append([float(x) for x in c['embedding']])
+    if ids:
+        upsert_web_texts(ids, texts, metas, embs)
+    if now - _last_purge > _PURGE_INTERVAL:
+        delete_expired_web_texts(now)
+        _last_purge = now
+
+
+async def persist_web_chunks(chunks: List[Dict]):
+    """Store vetted web chunks (dicts with text, meta and embedding). No-op unless enabled."""
+    if not settings.web_store_enabled:
+        return
+    chunks = [c for c in chunks if c.get('embedding') is not None and len(c.get('text', '')) >= 40]
+    if not chunks:
+        return
+    try:
+        await asyncio.to_thread(_persist, chunks)
+    except Exception as e:
+        logger.warning(f"Persisting web chunks failed: {e}")
+
+
+async def search_web_store(q_vec: List[float], top_k: int, threshold: float) -> List[Dict]:
+    """Unexpired stored web chunks scoring above threshold, as passages."""
+    if not settings.web_store_enabled:
+        return []
+    try:
+        results = await asyncio.to_thread(query_web_texts, q_vec, top_k, time.time())
+    except Exception as e:
+        logger.warning(f"Web store query failed: {e}")
+        return []
+    passages = []
+    for r in results:
+        score = 1.0 - float(r.get('distance', 0) or 0)
+        if score <= threshold:
+            continue
+        passages.append({
+            'id': r['id'],
+            'text': r['text'],
+            'source': r['metadata'].get('source', ''),
+            'score': score,
+            'meta': r['metadata'],
+        })
+    return passages
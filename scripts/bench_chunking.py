@@ -0,0 +1,80 @@
+"""Benchmark the shared chunker against the old word-list chunker.
+Run: python scripts/bench_chunking.py --source data/raw
+
+Uses the .txt/.md files under --source; with none, a synthetic mixed
+English/Arabic corpus of --synthetic-mb megabytes is generated instead.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path so we can import backend
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.services.chunking import chunk_text, estimate_tokens
+
+
+def legacy_chunk_text(text: str, chunk_size: int, chunk_overlap: int):
+    # The whitespace chunker previously duplicated in ingest.py and web_fetch.py
+    words = text.split()
+    chunks = []
+    start = 0
+    while start < len(words):
+        end = min(len(words), start + chunk_size)
+        chunks.append(' '.join(words[start:end]))
+        if end == len(words):
+            break
+        start = max(0, end - chunk_overlap)
+    return chunks
+
+
+def synthetic_corpus(megabytes: float) -> str:
+    rng = random.Random(0)
+    english = ('the prophet said that actions are judged by intentions and every person '
+               'will have what they intended prayer charity fasting pilgrimage').split()
+    arabic = 'قال رسول الله صلى الله عليه وسلم إنما الأعمال بالنيات وإنما لكل امرئ ما نوى'.split()
+    parts, size = [], 0
+    while size < megabytes * 1024 * 1024:
+        words = english if rng.random() < 0.6 else arabic
+        sentence = ' '.join(rng.choice(words) for _ in range(rng.randint(6, 30)))
+        sentence += rng.choice(['. ', '? ', '؟ ', '۔ ', '.\n\n'])
+        parts.append(sentence)
+        size += len(sentence.encode('utf-8'))
+    return ''.join(parts)
+
+
+def bench(name, fn, texts, size, overlap, megabytes):
+    start = time.perf_counter()
+    chunks = [c for t in texts for c in fn(t, size, overlap)]
+    elapsed = time.perf_counter() - start
+    tokens = [estimate_tokens(c) for c in chunks] or [0]
+    print(f'{name:>10}: {elapsed:7.2f}s  {megabytes / elapsed:7.1f} MB/s  {len(chunks):>7} chunks  '
+          f'est. tokens/chunk mean {sum(tokens) / len(tokens):6.0f} max {max(tokens):6d}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark text chunking')
+    parser.add_argument('--source', type=str, default='data/raw')
+    parser.add_argument('--synthetic-mb', type=float, default=50)
+    parser.add_argument('--chunk-size', type=int, default=800)
+    parser.add_argument('--chunk-overlap', type=int, default=200)
+    args = parser.parse_args()
+
+    root = Path(args.source)
+    files = [p for p in root.rglob('*') if p.suffix.lower() in ('.txt', '.md')] if root.exists() else []
+    if files:
+        texts = [p.read_text(encoding='utf-8', errors='ignore') for p in files]
+    else:
+        print(f'No .txt/.md files under {args.source}; using a {args.synthetic_mb} MB synthetic corpus.')
+        texts = [synthetic_corpus(args.synthetic_mb)]
+    megabytes = sum(len(t.encode('utf-8')) for t in texts) / (1024 * 1024)
+    print(f'{len(texts)} texts, {megabytes:.1f} MB, chunk size {args.chunk_size}, overlap {args.chunk_overlap}')
+
+    bench('words', legacy_chunk_text, texts, args.chunk_size, args.chunk_overlap, megabytes)
+    bench('structure', chunk_text, texts, args.chunk_size, args.chunk_overlap, megabytes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark HTML extraction engines on saved pages.
+Run: python scripts/bench_html_extract.py --pages data/bench/html
+
+Save a few real pages first (e.g. `curl -o data/bench/html/sunnah.html <url>`).
+Prints per-engine mean time per page and extracted text length, then how
+long the event loop stalls while pages are extracted concurrently on threads
+versus through extract_text_async (worker processes).
+"""
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add parent directory to path so we can import backend
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.services import html_extract
+
+
+def bench(fn, pages, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            fn(html)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(pages)) * 1000
+
+
+async def loop_stall(extract, pages, repeat: int):
+    """Run extract over all pages concurrently; return (seconds, worst event loop stall in ms)."""
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            worst = max(worst, time.perf_counter() - start - 0.001)
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(extract(html) for _ in range(repeat) for html in pages))
+    elapsed = time.perf_counter() - start
+    done = True
+    await tick
+    return elapsed, worst * 1000
+
+
+async def bench_loop(pages, repeat: int, workers: int):
+    threads = ThreadPoolExecutor(max_workers=workers)
+    loop = asyncio.get_running_loop()
+
+    async def on_threads(html):
+        return await loop.run_in_executor(threads, html_extract.extract_text, html)
+
+    await html_extract.extract_text_async(pages[0])  # start the worker processes
+    for name, extract in (('threads', on_threads), ('processes', html_extract.extract_text_async)):
+        elapsed, stall = await loop_stall(extract, pages, repeat)
+        print(f'{name:>16}: {elapsed:8.2f} s total  worst event loop stall {stall:7.1f} ms')
+    threads.shutdown()
+    html_extract.shutdown_extract_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HTML text extraction')
+    parser.add_argument('--pages', type=str, default='data/bench/html')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    files = sorted(Path(args.pages).glob('*.htm*'))
+    if not files:
+        print(f'No saved pages found in {args.pages}.')
+        return
+    pages = [f.read_text(encoding='utf-8', errors='ignore') for f in files]
+
+    engines = [('bs4/html.parser', html_extract._extract_bs4)]
+    if html_extract.lxml is not None:
+        engines.append(('lxml', html_extract._extract_lxml))
+    else:
+        print('lxml not installed; only the fallback engine is measured.')
+
+    print(f'{len(pages)} pages, {sum(len(p) for p in pages) / 1024:.0f} KiB total, x{args.repeat}')
+    for name, fn in engines:
+        ms = bench(fn, pages, args.repeat)
+        chars = sum(len(fn(p)) for p in pages)
+        print(f'{name:>16}: {ms:8.2f} ms/page  {chars:>9} chars extracted')
+
+    print(f'Concurrent extraction, {html_extract.settings.html_extract_workers} workers:')
+    asyncio.run(bench_loop(pages, args.repeat, html_extract.settings.html_extract_workers))
+
+
+if __name__ == '__main__':
+    main()
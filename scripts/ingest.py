@@ -4,20 +4,37 @@ import sys
 import json
 import orjson
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, List, Dict, Iterable, Iterator, Optional, Set, Tuple
 import asyncio
+import gzip
+import hashlib
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path so we can import backend
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from backend.core.config import settings
-from backend.services.embeddings import embedding_client
-from backend.db.vectordb import add_texts, reset_collection
+from backend.services.embeddings import get_embedding_client
+from backend.services.chunking import CHUNKER_VERSION, chunk_text
+from backend.services.dedup import MinHashDeduper
+from backend.db.vectordb import upsert_texts, reset_collection, delete_by_source, get_active_embedding_model
 
 TEXT_EXTS = {'.txt', '.md', '.json', '.jsonl'}
 PDF_EXTS = {'.pdf'}
 DOCX_EXTS = {'.docx', '.doc'}
 IMAGE_EXTS = {'.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif'}
+# Slow extractors worth shipping to worker processes
+POOL_EXTS = PDF_EXTS | DOCX_EXTS | IMAGE_EXTS
+# Bump an entry when its extractor's output changes to invalidate cached text
+EXTRACTOR_VERSIONS = {
+    **{ext: 'pypdf-1' for ext in PDF_EXTS},
+    **{ext: 'docx-1' for ext in DOCX_EXTS},
+    **{ext: 'tesseract-ara+eng-1' for ext in IMAGE_EXTS},
+}
 
 
 def read_text_file(path: Path) -> str:
@@ -28,37 +45,121 @@ def read_md_file(path: Path) -> str:
     return path.read_text(encoding='utf-8', errors='ignore')
 
 
-def read_json_file(path: Path) -> List[str]:
+# Larger .json files are parsed incrementally instead of loaded in one go
+JSON_STREAM_BYTES = 64 * 1024 * 1024
+_JSON_READ_SIZE = 1024 * 1024
+# Record fields that must not be overridden by source data
+RESERVED_META = {'source', 'chunk_index'}
+
+
+def _record(obj) -> Optional[Dict]:
+    """{'text', 'meta'} for an object with a text field, or None.
+
+    Its other scalar fields (book, number, grade, ...) become chunk metadata.
+    """
+    if not isinstance(obj, dict) or not isinstance(obj.get('text'), str):
+        return None
+    meta = {
+        k: v for k, v in obj.items()
+        if k != 'text' and k not in RESERVED_META and isinstance(v, (str, int, float, bool))
+    }
+    return {'text': obj['text'], 'meta': meta}
+
+
+def _iter_json_array(f) -> Iterator:
+    """Yield the elements of a top-level JSON array from a text file object."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        data = f.read(_JSON_READ_SIZE)
+        eof = not data
+        buf, pos = buf[pos:] + data, 0
+
+    def skip(chars: str):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip(' \t\r\n')
+    if buf[pos:pos + 1] != '[':
+        raise ValueError('expected a JSON array')
+    pos += 1
+    while True:
+        skip(' \t\r\n,')
+        if pos >= len(buf) or buf[pos] == ']':
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        # A value must be followed by ',' or ']'; otherwise it may be cut short
+        # by the buffer (e.g. "12" of "12.5"), so read more and decode it again.
+        # Any amount of whitespace may come first, so skip it across refills.
+        after = end
+        while True:
+            while after < len(buf) and buf[after] in ' \t\r\n':
+                after += 1
+            if after < len(buf) or eof:
+                break
+            start = pos
+            fill()  # drops buf[:pos], so shift the offsets with it
+            end, after = end - start, after - start
+        if buf[after:after + 1] not in (',', ']'):
+            if eof:
+                raise ValueError(f'malformed JSON array near offset {end}')
+            fill()
+            continue
+        pos = end
+        yield obj
+
+
+def read_json_file(path: Path) -> Iterator[Dict]:
     # Accept {"text": ...} or list of such
+    if path.stat().st_size > JSON_STREAM_BYTES:
+        with path.open('r', encoding='utf-8', errors='ignore') as f:
+            head = f.read(_JSON_READ_SIZE).lstrip()[:1]
+            f.seek(0)
+            if head == '[':
+                for item in _iter_json_array(f):
+                    rec = _record(item)
+                    if rec:
+                        yield rec
+                return
     try:
         obj = orjson.loads(path.read_bytes())
     except Exception:
         obj = json.loads(path.read_text(encoding='utf-8', errors='ignore'))
-    if isinstance(obj, dict) and 'text' in obj:
-        return [obj['text']]
-    if isinstance(obj, list):
-        out = []
-        for item in obj:
-            if isinstance(item, dict) and 'text' in item:
-                out.append(item['text'])
-        return out
-    return []
+    for item in obj if isinstance(obj, list) else [obj]:
+        rec = _record(item)
+        if rec:
+            yield rec
 
 
-def read_jsonl_file(path: Path) -> List[str]:
-    texts = []
-    with path.open('r', encoding='utf-8', errors='ignore') as f:
+def read_jsonl_file(path: Path) -> Iterator[Dict]:
+    with path.open('rb') as f:
         for line in f:
             line = line.strip()
             if not line:
                 continue
             try:
                 obj = orjson.loads(line)
-            except Exception:
-                obj = json.loads(line)
-            if isinstance(obj, dict) and 'text' in obj:
-                texts.append(obj['text'])
-    return texts
+            except orjson.JSONDecodeError:
+                try:
+                    obj = json.loads(line.decode('utf-8', errors='ignore'))
+                except ValueError:
+                    continue
+            rec = _record(obj)
+            if rec:
+                yield rec
 
 
 def try_read_pdf(path: Path) -> str:
@@ -88,8 +189,8 @@ def try_read_docx(path: Path) -> str:
         return ''
 
 
-def try_read_image_ocr(path: Path) -> str:
-    """Extract text from images using Tesseract OCR"""
+def try_read_image_ocr(path: Path, timeout: int = 0) -> str:
+    """Extract text from images using Tesseract OCR (timeout in seconds, 0 = none)"""
     try:
         from PIL import Image
         import pytesseract
@@ -98,29 +199,13 @@ def try_read_image_ocr(path: Path) -> str:
     try:
         img = Image.open(path)
         # For Arabic text, use: pytesseract.image_to_string(img, lang='ara+eng')
-        text = pytesseract.image_to_string(img, lang='ara+eng')
+        text = pytesseract.image_to_string(img, lang='ara+eng', timeout=timeout)
         return text.strip()
     except Exception:
         return ''
 
 
 
-def chunk_text(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
-    # Simple whitespace-based chunking
-    words = text.split()
-    chunks = []
-    start = 0
-    while start < len(words):
-        end = min(len(words), start + chunk_size)
-        chunks.append(' '.join(words[start:end]))
-        if end == len(words):
-            break
-        start = end - chunk_overlap
-        if start < 0:
-            start = 0
-    return chunks
-
-
 def discover_files(root: Path) -> List[Path]:
     files = []
     for p in root.rglob('*'):
@@ -132,78 +217,603 @@ def discover_files(root: Path) -> List[Path]:
     return files
 
 
-async def embed_and_index(docs: List[Dict], batch_size: int):
-    ids, texts, metas, embs = [], [], [], []
-    for i in range(0, len(docs), batch_size):
-        batch = docs[i:i+batch_size]
-        batch_texts = [d['text'] for d in batch]
-        vectors = await embedding_client.embed(batch_texts)
-        ids.extend([d['id'] for d in batch])
-        texts.extend(batch_texts)
-        metas.extend([d['meta'] for d in batch])
-        embs.extend(vectors)
-    add_texts(ids, texts, metas, embs)
+def read_file_texts(fp: Path, timeout: int = 0) -> Iterable:
+    """Texts of fp: strings, or {'text', 'meta'} records for JSON/JSONL.
+
+    JSON and JSONL are returned as lazy iterators that are read while chunking.
+    """
+    ext = fp.suffix.lower()
+    if ext == '.txt':
+        return [read_text_file(fp)]
+    if ext == '.md':
+        return [read_md_file(fp)]
+    if ext == '.json':
+        return read_json_file(fp)
+    if ext == '.jsonl':
+        return read_jsonl_file(fp)
+    if ext == '.pdf':
+        pdf_text = try_read_pdf(fp)
+        return [pdf_text] if pdf_text else []
+    if ext in DOCX_EXTS:
+        docx_text = try_read_docx(fp)
+        return [docx_text] if docx_text else []
+    if ext in IMAGE_EXTS:
+        img_text = try_read_image_ocr(fp, timeout=timeout)
+        return [img_text] if img_text else []
+    return []
 
 
-def main():
+def parse_file(path: str, timeout: int = 0) -> List[str]:
+    # Top-level so it can be pickled into pool workers
+    return read_file_texts(Path(path), timeout=timeout)
+
+
+class TextCache:
+    """Extracted text of PDF/DOCX/OCR sources, gzipped on disk.
+
+    Keyed by file content hash and extractor version, so resets and runs with
+    other chunking settings skip pypdf and Tesseract for files seen before.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.hits = 0
+
+    def _path(self, sha256: str, ext: str) -> Path:
+        return self.root / sha256[:2] / f'{sha256}-{EXTRACTOR_VERSIONS[ext]}.json.gz'
+
+    def get(self, sha256: Optional[str], ext: str) -> Optional[List[str]]:
+        if not sha256 or ext not in EXTRACTOR_VERSIONS:
+            return None
+        try:
+            with gzip.open(self._path(sha256, ext), 'rb') as f:
+                texts = orjson.loads(f.read())
+        except (OSError, EOFError, orjson.JSONDecodeError):
+            return None
+        self.hits += 1
+        return texts
+
+    def put(self, sha256: Optional[str], ext: str, texts: List[str]):
+        # Empty output may be a missing extractor or a timeout: worth retrying next time
+        if not sha256 or ext not in EXTRACTOR_VERSIONS or not texts:
+            return
+        path = self._path(sha256, ext)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + f'.{os.getpid()}.tmp')
+        with gzip.open(tmp, 'wb', compresslevel=6) as f:
+            f.write(orjson.dumps(list(texts)))
+        os.replace(tmp, path)
+
+
+def _print_error(message: str):
+    print(message, file=sys.stderr)
+
+
+def iter_parsed_files(
+    files: List[Path],
+    workers: int = 1,
+    timeout: int = 0,
+    on_error: Callable[[str], None] = _print_error,
+    text_cache: Optional[TextCache] = None,
+    digests: Optional[Dict[str, str]] = None,
+) -> Iterator[Tuple[Path, Iterable]]:
+    """Yield (file, texts) as files finish parsing, in no particular order.
+
+    PDF, DOCX and OCR extraction fan out over a process pool of `workers`;
+    cheap text formats are parsed inline while the pool is busy. A file that
+    exceeds `timeout` seconds is skipped (and retried on the next run) and its
+    worker is killed so it cannot stall the rest of the run. With a text_cache
+    and content digests ({source: sha256}), previously extracted text is reused.
+    """
+    digests = digests or {}
+
+    def remember(fp: Path, texts):
+        if text_cache is None or fp.suffix.lower() not in POOL_EXTS:
+            return
+        try:
+            text_cache.put(digests.get(str(fp)), fp.suffix.lower(), texts)
+        except OSError as e:
+            on_error(f'Could not cache extracted text of {fp}: {e}')
+
+    if text_cache is not None:
+        uncached = []
+        for fp in files:
+            texts = text_cache.get(digests.get(str(fp)), fp.suffix.lower())
+            if texts is None:
+                uncached.append(fp)
+            else:
+                yield fp, texts
+        files = uncached
+
+    if workers <= 1 or not any(fp.suffix.lower() in POOL_EXTS for fp in files):
+        for fp in files:
+            try:
+                texts = read_file_texts(fp, timeout=timeout)
+            except Exception as e:
+                on_error(f'Failed to parse {fp}: {e}')
+                continue
+            remember(fp, texts)
+            yield fp, texts
+        return
+
+    cheap = deque(fp for fp in files if fp.suffix.lower() not in POOL_EXTS)
+    queue = deque(fp for fp in files if fp.suffix.lower() in POOL_EXTS)
+    ctx = multiprocessing.get_context('spawn')
+    pool = ctx.Pool(workers)
+    inflight: Dict[Path, Tuple] = {}
+    try:
+        while queue or inflight or cheap:
+            # At most one task per worker, so submit time is start time
+            while queue and len(inflight) < workers:
+                fp = queue.popleft()
+                inflight[fp] = (pool.apply_async(parse_file, (str(fp), timeout)), time.monotonic())
+
+            progressed = False
+            for fp in [fp for fp, (res, _) in inflight.items() if res.ready()]:
+                res, _ = inflight.pop(fp)
+                progressed = True
+                try:
+                    texts = res.get()
+                except Exception as e:
+                    on_error(f'Failed to parse {fp}: {e}')
+                    continue
+                remember(fp, texts)
+                yield fp, texts
+
+            now = time.monotonic()
+            expired = [fp for fp, (_, started) in inflight.items() if timeout and now - started > timeout]
+            if expired:
+                for fp in expired:
+                    inflight.pop(fp)
+                    on_error(f'Parsing {fp} timed out after {timeout}s; skipped.')
+                # A pool cannot cancel one task: restart it and requeue the innocent ones
+                pool.terminate()
+                pool = ctx.Pool(workers)
+                queue.extendleft(reversed(list(inflight)))
+                inflight.clear()
+                progressed = True
+
+            if cheap:
+                fp = cheap.popleft()
+                try:
+                    texts = read_file_texts(fp)
+                except Exception as e:
+                    on_error(f'Failed to parse {fp}: {e}')
+                    continue
+                yield fp, texts
+            elif not progressed:
+                time.sleep(0.05)
+    finally:
+        pool.terminate()
+
+
+def iter_file_chunks(fp: Path, texts: Iterable, chunk_size: int, chunk_overlap: int) -> Iterator[Tuple[str, Dict]]:
+    idx = 0
+    for t in texts:
+        extra = {}
+        if isinstance(t, dict):
+            t, extra = t['text'], t['meta']
+        for ch in chunk_text(t, chunk_size, chunk_overlap):
+            meta = {
+                'title': fp.stem,
+                **extra,
+                'source': str(fp),
+                'chunk_index': idx,
+            }
+            yield ch, meta
+            idx += 1
+
+
+def chunk_id(source: str, idx: int, text: str) -> str:
+    """Stable id derived from the chunk's file, position and content."""
+    digest = hashlib.sha1(f'{source}\0{idx}\0{text}'.encode('utf-8')).hexdigest()
+    return f'doc-{digest[:24]}'
+
+
+def file_sha256(fp: Path) -> str:
+    h = hashlib.sha256()
+    with fp.open('rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Manifest:
+    """Every indexed file with its size, mtime and content hash.
+
+    A file is recorded only once all of its chunks are in the index, so the
+    manifest doubles as the resume point of an interrupted run.
+    """
+
+    SAVE_INTERVAL = 2.0  # seconds; losing an entry only means re-embedding that file
+
+    def __init__(self, path: Path, params: Dict):
+        self.path = path
+        self.params = params
+        self.files: Dict[str, Dict] = {}
+        self.compatible = True
+        self._last_save = 0.0
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            state = json.loads(self.path.read_text(encoding='utf-8'))
+        except Exception:
+            return
+        self.files = state.get('files', {})
+        # Indexed with other chunking or another embedding model: everything is stale
+        self.compatible = state.get('params') == self.params
+
+    def record(self, source: str, info: Dict):
+        self.files[source] = info
+        if time.monotonic() - self._last_save > self.SAVE_INTERVAL:
+            self.save()
+
+    def forget(self, source: str):
+        self.files.pop(source, None)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'params': self.params, 'files': self.files}), encoding='utf-8')
+        os.replace(tmp, self.path)
+        self._last_save = time.monotonic()
+
+    def clear(self):
+        self.files = {}
+        if self.path.exists():
+            self.path.unlink()
+
+
+def plan_changes(root: Path, files: List[Path], manifest: Manifest) -> Tuple[Dict[str, Dict], List[str]]:
+    """Return ({source: fingerprint} of new/changed files, [sources deleted from disk]).
+
+    Size and mtime decide quickly; the content hash is only computed when they differ.
+    """
+    changed: Dict[str, Dict] = {}
+    for fp in files:
+        source = str(fp)
+        st = fp.stat()
+        info = {'size': st.st_size, 'mtime': st.st_mtime}
+        known = manifest.files.get(source) if manifest.compatible else None
+        if known and known['size'] == info['size'] and known['mtime'] == info['mtime']:
+            continue
+        info['sha256'] = file_sha256(fp)
+        if known and known.get('sha256') == info['sha256']:
+            manifest.files[source] = {**known, **info}  # touched but identical
+            continue
+        changed[source] = info
+    present = {str(fp) for fp in files}
+    deleted = [
+        source for source in manifest.files
+        if source not in present and Path(source).is_relative_to(root)
+    ]
+    return changed, deleted
+
+
+def expand_dependents(files: List[Path], manifest: Manifest, changed: Dict[str, Dict], deleted: List[str]):
+    """Add to changed every file whose near-duplicate chunks were kept only under
+    a file that is now changed or deleted, so re-indexing it brings them back.
+    """
+    present = {str(fp) for fp in files}
+    gone = set(changed) | set(deleted)
+    while True:
+        dependents = {
+            source: info for source, info in manifest.files.items()
+            if source in present and source not in gone and gone.intersection(info.get('dup_of', ()))
+        }
+        if not dependents:
+            return
+        for source, info in dependents.items():
+            changed[source] = {k: v for k, v in info.items() if k != 'dup_of'}
+        gone.update(dependents)
+
+
+class StageStats:
+    """Items handled by one pipeline stage and the time it spent working on them."""
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.count = 0
+        self.busy = 0.0
+
+    def add(self, n: int, seconds: float):
+        self.count += n
+        self.busy += seconds
+
+    def report(self, wall: float) -> str:
+        rate = self.count / wall if wall > 0 else 0.0
+        return f'{self.name:>6}: {self.count:>7} {self.unit:<7} busy {self.busy:7.1f}s  {rate:8.1f} {self.unit}/s'
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+class IngestPipeline:
+    """parse -> chunk -> embed (N concurrent) -> write, joined by bounded queues.
+
+    Backpressure from the queues keeps memory bounded; parsing keeps running
+    while earlier batches are being embedded, so the embedding server is not
+    left idle behind slow PDFs or OCR.
+    """
+
+    def __init__(
+        self,
+        args,
+        manifest: Manifest,
+        fingerprints: Dict[str, Dict],
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        self.args = args
+        self.manifest = manifest
+        self.fingerprints = fingerprints
+        self.cancel_event = cancel_event or threading.Event()
+        self.errors: List[str] = []
+        self.files_total = len(fingerprints)
+        self.started = time.perf_counter()
+        self.stats = {
+            'parse': StageStats('parse', 'files'),
+            'chunk': StageStats('chunk', 'chunks'),
+            'embed': StageStats('embed', 'chunks'),
+            'write': StageStats('write', 'chunks'),
+        }
+        self._unwritten: Dict[str, int] = {}  # source -> chunks not yet in the index
+        self._chunked: Set[str] = set()  # sources whose chunks have all been produced
+        # Only chunks of this run are compared; --reset dedups the whole corpus
+        self.deduper = MinHashDeduper(args.dedup_threshold) if args.dedup_threshold > 0 else None
+        self.embedder = get_embedding_client(manifest.params['embedding_model'])
+        self.text_cache = None if args.no_text_cache else TextCache(Path(settings.data_processed_dir) / 'textcache')
+
+    async def run(self, files: List[Path]) -> int:
+        n_embedders = max(1, self.args.embed_concurrency)
+        parsed_q: asyncio.Queue = asyncio.Queue(maxsize=max(2, self.args.workers * 2))
+        embed_q: asyncio.Queue = asyncio.Queue(maxsize=n_embedders * 2)
+        write_q: asyncio.Queue = asyncio.Queue(maxsize=n_embedders * 2)
+        tasks = [
+            asyncio.create_task(self._parse_stage(files, parsed_q)),
+            asyncio.create_task(self._chunk_stage(parsed_q, embed_q, n_embedders)),
+            *[asyncio.create_task(self._embed_stage(embed_q, write_q)) for _ in range(n_embedders)],
+            asyncio.create_task(self._write_stage(write_q, n_embedders)),
+        ]
+        self.started = time.perf_counter()
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            # Keep whatever finished, also when cancelled or failing
+            self._settle()
+            self.manifest.save()
+        return self.stats['write'].count
+
+    def _check_cancel(self):
+        if self.cancel_event.is_set():
+            raise IngestCancelled()
+
+    def _record_error(self, message: str):
+        self.errors.append(message)
+        _print_error(message)
+
+    def progress(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            'files_total': self.files_total,
+            'files_parsed': self.stats['parse'].count,
+            'chunks': self.stats['chunk'].count,
+            'chunks_written': self.stats['write'].count,
+            'duplicates_skipped': self.deduper.duplicates if self.deduper else 0,
+            'text_cache_hits': self.text_cache.hits if self.text_cache else 0,
+            'embeddings_per_sec': round(self.stats['embed'].count / elapsed, 2) if elapsed > 0 else 0.0,
+            'errors': list(self.errors),
+        }
+
+    async def _parse_stage(self, files: List[Path], out_q: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        # The generator blocks on the process pool; drive it from one dedicated thread
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-parse')
+        parsed = iter_parsed_files(
+            files, workers=self.args.workers, timeout=self.args.parse_timeout, on_error=self._record_error,
+            text_cache=self.text_cache,
+            digests={source: info.get('sha256') for source, info in self.fingerprints.items()},
+        )
+        try:
+            while True:
+                self._check_cancel()
+                start = time.perf_counter()
+                item = await loop.run_in_executor(executor, next, parsed, None)
+                if item is None:
+                    break
+                self.stats['parse'].add(1, time.perf_counter() - start)
+                await out_q.put(item)
+        finally:
+            executor.submit(parsed.close)  # runs after any in-flight next(); stops the pool
+            executor.shutdown(wait=False)
+        await out_q.put(None)
+
+    async def _chunk_stage(self, in_q: asyncio.Queue, out_q: asyncio.Queue, n_embedders: int):
+        stats = self.stats['chunk']
+        batch: List[Dict] = []
+        while True:
+            item = await in_q.get()
+            if item is None:
+                break
+            self._check_cancel()
+            fp, texts = item
+            source = str(fp)
+            self._unwritten.setdefault(source, 0)
+            dup_of: Set[str] = set()
+            start = time.perf_counter()
+            try:
+                # Streaming readers (JSON/JSONL) do their I/O here, one record at a time
+                for ch, meta in iter_file_chunks(fp, texts, self.args.chunk_size, self.args.chunk_overlap):
+                    if self.deduper is not None:
+                        owner = self.deduper.find_duplicate(ch, source)
+                        if owner is not None:
+                            dup_of.add(owner)
+                            continue
+                    batch.append({'id': chunk_id(source, meta['chunk_index'], ch), 'text': ch, 'meta': meta})
+                    self._unwritten[source] += 1
+                    stats.count += 1
+                    if len(batch) >= self.args.batch_size:
+                        stats.busy += time.perf_counter() - start
+                        await out_q.put(batch)
+                        batch = []
+                        start = time.perf_counter()
+            except (OSError, ValueError) as e:
+                # Not marked as chunked, so the file stays out of the manifest and is retried
+                stats.busy += time.perf_counter() - start
+                self._record_error(f'Failed to read {fp}: {e}')
+                continue
+            stats.busy += time.perf_counter() - start
+            dup_of.discard(source)
+            if dup_of:
+                # Skipped chunks live under these files; see expand_dependents
+                self.fingerprints[source] = {**self.fingerprints[source], 'dup_of': sorted(dup_of)}
+            self._chunked.add(source)
+        if batch:
+            await out_q.put(batch)
+        for _ in range(n_embedders):
+            await out_q.put(None)
+
+    async def _embed_stage(self, in_q: asyncio.Queue, out_q: asyncio.Queue):
+        while True:
+            batch = await in_q.get()
+            if batch is None:
+                await out_q.put(None)
+                return
+            self._check_cancel()
+            start = time.perf_counter()
+            vectors = await self.embedder.embed([d['text'] for d in batch])
+            self.stats['embed'].add(len(batch), time.perf_counter() - start)
+            await out_q.put((batch, vectors))
+
+    async def _write_stage(self, in_q: asyncio.Queue, n_producers: int):
+        finished = 0
+        while finished < n_producers:
+            item = await in_q.get()
+            if item is None:
+                finished += 1
+                continue
+            batch, vectors = item
+            start = time.perf_counter()
+            # Upsert: stable ids make re-writing chunks of an interrupted run harmless
+            await asyncio.to_thread(
+                upsert_texts,
+                [d['id'] for d in batch],
+                [d['text'] for d in batch],
+                [d['meta'] for d in batch],
+                vectors,
+            )
+            self.stats['write'].add(len(batch), time.perf_counter() - start)
+            for d in batch:
+                self._unwritten[d['meta']['source']] -= 1
+            self._settle()
+
+    def _settle(self):
+        """Record fully written files in the manifest."""
+        for source in [s for s in self._chunked if self._unwritten.get(s, 0) == 0]:
+            self._chunked.discard(source)
+            self.manifest.record(source, self.fingerprints[source])
+
+    def report(self, wall: float) -> str:
+        lines = [st.report(wall) for st in self.stats.values()]
+        if self.text_cache is not None and self.text_cache.hits:
+            lines.append(f' cache: {self.text_cache.hits:>7} files served from the extracted-text cache')
+        if self.deduper is not None:
+            d = self.deduper
+            lines.append(f' dedup: {d.duplicates:>7} of {d.checked} chunks skipped as near-duplicates ({d.ratio:.1%})')
+        return '\n'.join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description='Ingest and index texts')
     parser.add_argument('--source', type=str, default=settings.data_raw_dir)
     parser.add_argument('--reset', action='store_true')
     parser.add_argument('--batch-size', type=int, default=32)
-    parser.add_argument('--chunk-size', type=int, default=800)
-    parser.add_argument('--chunk-overlap', type=int, default=200)
-    args = parser.parse_args()
-
+    parser.add_argument('--chunk-size', type=int, default=800,
+                        help='Target chunk length in estimated tokens')
+    parser.add_argument('--chunk-overlap', type=int, default=200,
+                        help='Overlap between consecutive chunks in estimated tokens')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help='Processes for PDF/DOCX/OCR parsing (1 = parse inline)')
+    parser.add_argument('--parse-timeout', type=int, default=300,
+                        help='Seconds before a single file is abandoned (0 = no limit)')
+    parser.add_argument('--embed-concurrency', type=int, default=4,
+                        help='Embedding batches in flight at once')
+    parser.add_argument('--no-text-cache', action='store_true',
+                        help='Re-run PDF/DOCX/OCR extraction instead of reusing cached text')
+    parser.add_argument('--dedup-threshold', type=float, default=0.9,
+                        help='Skip chunks whose estimated Jaccard similarity to an earlier one is at least this (0 = off)')
+    return parser
+
+
+def run_ingest(
+    args,
+    cancel_event: Optional[threading.Event] = None,
+    on_pipeline: Optional[Callable[[IngestPipeline], None]] = None,
+    log: Callable[[str], None] = print,
+) -> Dict:
+    """Run one ingest synchronously (it owns its event loop) and return a summary.
+
+    on_pipeline receives the pipeline before it starts so callers can poll progress();
+    setting cancel_event stops the run between batches with IngestCancelled.
+    """
     root = Path(args.source)
     root.mkdir(parents=True, exist_ok=True)
 
     if args.reset:
-        reset_collection()
+        # A rebuild from scratch adopts the configured model
+        reset_collection(settings.embedding_model)
+    # New chunks must match the vectors already in the active collection
+    manifest = Manifest(
+        Path(settings.data_processed_dir) / 'ingest_manifest.json',
+        {
+            'chunk_size': args.chunk_size, 'chunk_overlap': args.chunk_overlap,
+            'chunker': CHUNKER_VERSION, 'embedding_model': get_active_embedding_model(),
+        },
+    )
+    if args.reset:
+        manifest.clear()
+    else:
+        manifest.load()
 
     files = discover_files(root)
-    docs = []
-    doc_id = 0
-    for fp in files:
-        ext = fp.suffix.lower()
-        texts = []
-        if ext == '.txt':
-            texts = [read_text_file(fp)]
-        elif ext == '.md':
-            texts = [read_md_file(fp)]
-        elif ext == '.json':
-            texts = read_json_file(fp)
-        elif ext == '.jsonl':
-            texts = read_jsonl_file(fp)
-        elif ext == '.pdf':
-            pdf_text = try_read_pdf(fp)
-            if pdf_text:
-                texts = [pdf_text]
-        elif ext in DOCX_EXTS:
-            docx_text = try_read_docx(fp)
-            if docx_text:
-                texts = [docx_text]
-        elif ext in IMAGE_EXTS:
-            img_text = try_read_image_ocr(fp)
-            if img_text:
-                texts = [img_text]
-        
-        for t in texts:
-            chunks = chunk_text(t, args.chunk_size, args.chunk_overlap)
-            for idx, ch in enumerate(chunks):
-                meta = {
-                    'source': str(fp),
-                    'chunk_index': idx,
-                    'title': fp.stem,
-                }
-                docs.append({'id': f'doc-{doc_id}', 'text': ch, 'meta': meta})
-                doc_id += 1
-
-    if not docs:
-        print('No documents found to ingest.')
-        return
+    changed, deleted = plan_changes(root, files, manifest)
+    expand_dependents(files, manifest, changed, deleted)
+    # Old chunks of changed or deleted files go first; new ones are written below.
+    # Changed files not yet in the manifest may still have chunks from an
+    # interrupted run, so they are cleared too (a reset collection is empty already).
+    for source in deleted + ([] if args.reset else list(changed)):
+        delete_by_source(source)
+        manifest.forget(source)
+    manifest.save()
+    log(f'{len(files)} files: {len(changed)} new or changed, {len(deleted)} deleted, '
+        f'{len(files) - len(changed)} unchanged.')
+
+    pipeline = IngestPipeline(args, manifest, changed, cancel_event=cancel_event)
+    if on_pipeline:
+        on_pipeline(pipeline)
+    if not changed:
+        log('No documents found to ingest.')
+        return {'files': len(files), 'changed': 0, 'deleted': len(deleted), 'chunks_written': 0}
+
+    written = asyncio.run(pipeline.run([fp for fp in files if str(fp) in changed]))
+    log(f'Ingested {written} chunks into the vector DB.')
+    log(pipeline.report(time.perf_counter() - pipeline.started))
+    return {
+        'files': len(files), 'changed': len(changed), 'deleted': len(deleted), 'chunks_written': written,
+        'duplicates_skipped': pipeline.deduper.duplicates if pipeline.deduper else 0,
+    }
+
 
-    asyncio.run(embed_and_index(docs, args.batch_size))
-    print(f'Ingested {len(docs)} chunks into the vector DB.')
+def main():
+    run_ingest(build_parser().parse_args())
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,192 @@
+"""Re-embed the index with another embedding model, without downtime.
+Run: python scripts/reembed.py --model mxbai-embed-large
+
+Copies every document of the active collection into a new versioned
+collection embedded with the new model, validates it, switches queries over
+with one atomic pointer write and then drops the old collection. /ask keeps
+answering from the old collection until the switch.
+
+Do not ingest while this runs: new chunks would land in the old collection
+only. Through the API both run as jobs of the same queue, which serializes them.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Add parent directory to path so we can import backend
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.core.config import settings
+from backend.db.vectordb import (
+    create_collection,
+    drop_collection,
+    get_active_index,
+    get_collection,
+    reset_web_collection,
+    switch_collection,
+    versioned_collection_name,
+)
+from backend.db.webcache import WebCache
+from backend.services.embeddings import get_embedding_client
+from scripts.ingest import IngestCancelled, Manifest, StageStats
+
+# Let queries already running on the old collection finish before it is dropped
+DROP_GRACE_SECONDS = 10
+# Documents whose new vector must retrieve themselves from the new collection
+VALIDATION_SAMPLES = 5
+
+
+class Reembedder:
+    """Copy documents from one collection into another with fresh embeddings."""
+
+    def __init__(self, args, source, target, model: str, cancel_event: Optional[threading.Event] = None):
+        self.args = args
+        self.source = source
+        self.target = target
+        self.embedder = get_embedding_client(model)
+        self.cancel_event = cancel_event or threading.Event()
+        self.phase = 'copying'
+        self.total = source.count()
+        self.stats = StageStats('embed', 'chunks')
+        self.samples: List[Tuple[str, List[float]]] = []
+        self.started = time.perf_counter()
+
+    def _check_cancel(self):
+        if self.cancel_event.is_set():
+            raise IngestCancelled()
+
+    def progress(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            'phase': self.phase,
+            'chunks_total': self.total,
+            'chunks_written': self.stats.count,
+            'embeddings_per_sec': round(self.stats.count / elapsed, 2) if elapsed > 0 else 0.0,
+            'errors': [],
+        }
+
+    async def copy(self):
+        in_flight = set()
+        try:
+            for offset in range(0, self.total, self.args.batch_size):
+                self._check_cancel()
+                page = await asyncio.to_thread(
+                    self.source.get, limit=self.args.batch_size, offset=offset, include=['documents', 'metadatas']
+                )
+                in_flight.add(asyncio.create_task(self._embed_page(page)))
+                if len(in_flight) >= max(1, self.args.embed_concurrency):
+                    done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+            await asyncio.gather(*in_flight)
+        except BaseException:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            raise
+
+    async def _embed_page(self, page: Dict):
+        if not page['ids']:
+            return
+        start = time.perf_counter()
+        vectors = await self.embedder.embed(page['documents'])
+        await asyncio.to_thread(
+            self.target.upsert,
+            ids=page['ids'], documents=page['documents'], metadatas=page['metadatas'], embeddings=vectors,
+        )
+        self.stats.add(len(page['ids']), time.perf_counter() - start)
+        if len(self.samples) < VALIDATION_SAMPLES:
+            self.samples.append((page['ids'][0], vectors[0]))
+
+    def validate(self):
+        """Raise ValueError unless the new collection is complete and searchable."""
+        self.phase = 'validating'
+        count = self.target.count()
+        if count != self.total:
+            raise ValueError(f'new collection has {count} chunks, expected {self.total}')
+        for doc_id, vector in self.samples:
+            res = self.target.query(query_embeddings=[vector], n_results=3)
+            if doc_id not in res['ids'][0]:
+                raise ValueError(f'chunk {doc_id} is not retrievable by its own embedding')
+
+
+def _retarget_manifest(old_model: str, new_model: str):
+    # The index now holds new-model vectors of the same chunks: keep incremental ingest incremental
+    path = Path(settings.data_processed_dir) / 'ingest_manifest.json'
+    try:
+        state = json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return
+    params = state.get('params') or {}
+    if params.get('embedding_model') != old_model:
+        return
+    manifest = Manifest(path, {**params, 'embedding_model': new_model})
+    manifest.files = state.get('files', {})
+    manifest.save()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Re-embed the index with another model (blue/green swap)')
+    parser.add_argument('--model', type=str, default=settings.embedding_model,
+                        help='Embedding model for the new collection')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--embed-concurrency', type=int, default=4,
+                        help='Embedding batches in flight at once')
+    return parser
+
+
+def run_reembed(
+    args,
+    cancel_event: Optional[threading.Event] = None,
+    on_pipeline: Optional[Callable[[Reembedder], None]] = None,
+    log: Callable[[str], None] = print,
+) -> Dict:
+    """Build, validate and switch to a collection embedded with args.model; return a summary."""
+    active = get_active_index()
+    old_name, old_model = active['collection'], active['embedding_model']
+    new_name = versioned_collection_name(args.model)
+    reembedder = Reembedder(args, get_collection(), create_collection(new_name), args.model, cancel_event)
+    if on_pipeline:
+        on_pipeline(reembedder)
+    log(f'Re-embedding {reembedder.total} chunks from {old_name} ({old_model}) into {new_name} ({args.model}).')
+
+    try:
+        asyncio.run(reembedder.copy())
+        reembedder.validate()
+    except BaseException:
+        drop_collection(new_name)
+        raise
+
+    reembedder.phase = 'switching'
+    switch_collection(new_name, args.model)
+    log(f'Queries now use {new_name}.')
+    _retarget_manifest(old_model, args.model)
+    if args.model != old_model:
+        # Cached web chunk vectors belong to the old model
+        WebCache(settings.web_cache_path, settings.web_cache_max_bytes).clear()
+        reset_web_collection()
+
+    reembedder.phase = 'dropping old collection'
+    time.sleep(DROP_GRACE_SECONDS)
+    drop_collection(old_name)
+    reembedder.phase = 'done'
+    log(reembedder.stats.report(time.perf_counter() - reembedder.started))
+    return {
+        'collection': new_name,
+        'embedding_model': args.model,
+        'previous_collection': old_name,
+        'previous_embedding_model': old_model,
+        'chunks_written': reembedder.stats.count,
+    }
+
+
+def main():
+    run_reembed(build_parser().parse_args())
+
+if __name__ == '__main__':
+    main()
@@ -23,6 +23,12 @@ let chats = [];
 let currentRequestController = null; // For cancelling ongoing requests
 let currentChatHasMessages = false; // Track if current chat has any messages
 
+// Chats and messages are fetched a page at a time (keyset cursors from X-Next-Cursor)
+const CHAT_PAGE_SIZE = 50;
+const MESSAGE_PAGE_SIZE = 50;
+let chatsCursor = null; // Cursor for the next page of older chats
+let messagesCursor = null; // before_id for the next page of older messages in the open chat
+
 // Initialize
 document.addEventListener('DOMContentLoaded', () => {
   setupEventListeners();
@@ -387,6 +393,7 @@ function startNewChat() {
   }
 
   currentChatId = Date.now().toString();
+  messagesCursor = null;
   // Do NOT create chat on server yet; defer until first message
   // Add to local array only (ephemeral until first send)
   chats.push({ id: currentChatId, messages: [], title: 'New Chat' });
@@ -425,16 +432,7 @@ async function handleSubmit(e) {
   welcomeScreen.style.display = 'none';
   messagesContainer.classList.add('active');
   
-  // Gather last 2 messages for context (1 user + 1 assistant pair)
-  const chat = chats.find(c => c.id === currentChatId);
-  let conversationHistory = [];
-  if (chat && chat.messages && chat.messages.length > 0) {
-    const lastMessages = chat.messages.slice(-2);
-    conversationHistory = lastMessages.map(m => ({
-      role: m.role,
-      content: m.text
-    }));
-  }
+  // No conversation_history: the server keeps this chat's recent context (chat_id)
   
   // Add user message
   addMessage('user', question);
@@ -459,8 +457,7 @@ async function handleSubmit(e) {
         chat_id: currentChatId,
         source_mode: sourceModeSelect ? sourceModeSelect.value : 'rag',
         // Backward compatibility: toggle use_web for rag+internet or internet only
-        use_web: (sourceModeSelect && (sourceModeSelect.value === 'rag+internet' || sourceModeSelect.value === 'internet')) ? true : undefined,
-        conversation_history: conversationHistory.length > 0 ? conversationHistory : undefined
+        use_web: (sourceModeSelect && (sourceModeSelect.value === 'rag+internet' || sourceModeSelect.value === 'internet')) ? true : undefined
       }),
       signal: currentRequestController.signal
     });
@@ -496,21 +493,25 @@ async function handleSubmit(e) {
   }
 }
 
-async function loadChatHistory() {
+async function loadChatHistory(append = false) {
   try {
-    const res = await fetch(`${API_BASE}/chats`);
+    let url = `${API_BASE}/chats?limit=${CHAT_PAGE_SIZE}`;
+    if (append && chatsCursor) url += `&cursor=${encodeURIComponent(chatsCursor)}`;
+    const res = await fetch(url);
     if (!res.ok) return;
     
     const serverChats = await res.json();
+    chatsCursor = res.headers.get('X-Next-Cursor');
     
     // Convert server chats to local format
-    chats = serverChats.map(chat => ({
+    const page = serverChats.map(chat => ({
       id: chat.id,
       title: chat.title,
       messages: [], // Messages loaded on demand
       created_at: chat.created_at,
       updated_at: chat.updated_at
     }));
+    chats = append ? chats.concat(page.filter(c => !chats.some(x => x.id === c.id))) : page;
     
     updateChatHistory();
   } catch (err) {
@@ -518,7 +519,7 @@ async function loadChatHistory() {
   }
 }
 
-function addMessage(role, text, citations = null, isFallback = false, mode = 'rag') {
+function createMessageElement(role, text, citations = null, isFallback = false, mode = 'rag') {
   const messageDiv = document.createElement('div');
   messageDiv.className = `message ${role}`;
   
@@ -597,7 +598,11 @@ function addMessage(role, text, citations = null, isFallback = false, mode = 'ra
   }
   
   messageDiv.appendChild(content);
-  messagesContainer.appendChild(messageDiv);
+  return messageDiv;
+}
+
+function addMessage(role, text, citations = null, isFallback = false, mode = 'rag') {
+  messagesContainer.appendChild(createMessageElement(role, text, citations, isFallback, mode));
   
   // Scroll to bottom
   messagesContainer.scrollIntoView({ behavior: 'smooth', block: 'end' });
@@ -672,6 +677,65 @@ function updateChatHistory() {
     chatItem.addEventListener('click', () => loadChat(chat.id));
     chatHistory.appendChild(chatItem);
   });
+
+  if (chatsCursor) {
+    const moreBtn = document.createElement('button');
+    moreBtn.className = 'load-more-btn';
+    moreBtn.textContent = 'Load older chats';
+    moreBtn.addEventListener('click', () => loadChatHistory(true));
+    chatHistory.appendChild(moreBtn);
+  }
+}
+
+function messagesUrl(chatId, beforeId = null) {
+  let url = `${API_BASE}/chats/${chatId}/messages?limit=${MESSAGE_PAGE_SIZE}`;
+  if (beforeId) url += `&before_id=${beforeId}`;
+  return url;
+}
+
+function renderLoadEarlierButton() {
+  const existing = document.getElementById('loadEarlierBtn');
+  if (existing) existing.remove();
+  if (!messagesCursor) return;
+  const btn = document.createElement('button');
+  btn.id = 'loadEarlierBtn';
+  btn.className = 'load-more-btn';
+  btn.textContent = 'Load earlier messages';
+  btn.addEventListener('click', loadEarlierMessages);
+  messagesContainer.prepend(btn);
+}
+
+async function loadEarlierMessages() {
+  const chatId = currentChatId;
+  if (!chatId || !messagesCursor) return;
+  try {
+    const res = await fetch(messagesUrl(chatId, messagesCursor));
+    if (!res.ok) throw new Error('Failed to load messages');
+    const messages = await res.json();
+    if (chatId !== currentChatId) return; // user switched chats meanwhile
+    messagesCursor = res.headers.get('X-Next-Cursor');
+    
+    // Insert above the current messages without moving what the user is reading
+    const scroller = document.scrollingElement;
+    const heightBefore = scroller.scrollHeight;
+    const btn = document.getElementById('loadEarlierBtn');
+    const fragment = document.createDocumentFragment();
+    messages.forEach(msg => {
+      fragment.appendChild(createMessageElement(msg.role, msg.content, msg.citations, msg.is_fallback, msg.mode || 'rag'));
+    });
+    if (btn) btn.after(fragment); else messagesContainer.prepend(fragment);
+    scroller.scrollTop += scroller.scrollHeight - heightBefore;
+    
+    const chat = chats.find(c => c.id === chatId);
+    if (chat) {
+      chat.messages = messages.map(msg => ({
+        role: msg.role, text: msg.content, citations: msg.citations, isFallback: msg.is_fallback, mode: msg.mode || 'rag'
+      })).concat(chat.messages);
+    }
+    renderLoadEarlierButton();
+  } catch (err) {
+    console.error('Error loading earlier messages:', err);
+  }
 }
 
 async function deleteChat(chatId) {
@@ -698,13 +762,16 @@ async function deleteChat(chatId) {
 
 async function loadChat(chatId) {
   try {
-    // Fetch messages from server
-    const res = await fetch(`${API_BASE}/chats/${chatId}/messages`);
+    // Fetch the newest page of messages; older ones load on demand
+    const res = await fetch(messagesUrl(chatId));
     if (!res.ok) throw new Error('Failed to load chat');
     
     const messages = await res.json();
+    messagesCursor = res.headers.get('X-Next-Cursor');
     
     currentChatId = chatId;
+    const chat = chats.find(c => c.id === chatId);
+    if (chat) chat.messages = []; // refilled by addMessage below
     messagesContainer.innerHTML = '';
     if (!messages || messages.length === 0) {
       // Show welcome when chat has no messages yet
@@ -721,6 +788,7 @@ async function loadChat(chatId) {
     messages.forEach(msg => {
       addMessage(msg.role, msg.content, msg.citations, msg.is_fallback, msg.mode || 'rag');
     });
+    renderLoadEarlierButton();
     
     closeMobileMenu();
   } catch (err) {